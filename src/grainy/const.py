@@ -29,6 +29,14 @@ dict(PERM_STRING_MAP).get(PERM_READ) #r
 dict(PERM_STRING_MAP).get(PERM_UPDATE) #u
 dict(PERM_STRING_MAP).get(PERM_DELETE) #d
 ```
+
+## Merge Strategies
+
+Strategies of `PermissionSet.merge` for permissions under the same
+namespace
+
+- `MERGE_OVERRIDE`: the permission of the later set replaces the other
+- `MERGE_OR`: the permission flags are combined (bitwise or)
 """
 
 PERM_READ = 0x01
@@ -50,3 +58,6 @@ PERM_STRING_MAP = [
 MATCH_NO = 0
 MATCH_YES = 1
 MATCH_PARTIAL = 2
+
+MERGE_OVERRIDE = "override"
+MERGE_OR = "or"
@@ -4,10 +4,67 @@ core functionality
 
 from __future__ import annotations
 
-from typing import Any, Callable, Iterator
+import abc
+import contextlib
+import functools
+import json
+import re
+import struct
+import sys
+import threading
+import time
+import types
+from collections import ChainMap, OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Iterator
 
 import grainy.const as const
 
+# maximum number of interned namespaces kept by `Namespace.of`
+NAMESPACE_CACHE_SIZE = 65536
+
+# maximum number of flag strings remembered per mapper by `int_flags`
+FLAG_CACHE_SIZE = 1024
+# maximum number of flag mappers other than `const.PERM_STRING_MAP`
+# whose lookup tables are kept, see `_flag_tables`
+FLAG_MAPPER_CACHE_SIZE = 32
+
+# methods of a permission set wrapped by `PermissionSet.instrument`
+_INSTRUMENTED = (
+    "get_permissions",
+    "check",
+    "expand",
+    "update_index",
+    "apply",
+    "_check",
+    "_check_compiled",
+    "_check_many",
+    "_index_rebuild",
+)
+
+# marks values removed during `Applicator.apply`
+_removed = object()
+
+# header of the binary format written by `PermissionSet.dumps`
+_DUMP_MAGIC = b"GRNY"
+_DUMP_VERSION = 1
+# magic, version, number of strings, size of the string data,
+# number of permissions, number of index branches, number of
+# top level index branches
+_DUMP_HEADER = struct.Struct("<4sBIIIII")
+# permission: key, namespace, flags, value
+_DUMP_PERMISSION = struct.Struct("<IIBq")
+# index branch: key, flags, value, number of child branches
+_DUMP_BRANCH = struct.Struct("<IBqI")
+_DUMP_HAS_VALUE = 0x01
+_DUMP_IMPLICIT = 0x02
+_DUMP_STRIP = 0x04
+
+# tokens of raw JSON text scanned by `JSONApplicator`
+_JSON_WS = re.compile(r"[ \t\n\r]*")
+_JSON_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+_JSON_SCALAR = re.compile(r"[^,:\]}\s]+")
+_JSON_DECODER = json.JSONDecoder()
+
 
 def list_key_handler(row: dict, idx: int) -> str:
     if isinstance(row, dict):
@@ -15,6 +72,62 @@ def list_key_handler(row: dict, idx: int) -> str:
     return idx
 
 
+def _build_flag_tables(mapper: tuple[tuple[int, str]]) -> tuple:
+    """
+    Builds the lookup tables of a flag mapper, see `_flag_tables`
+
+    **Returns**
+
+    `tuple(<dict>,<list>,<dict>)`: int flags by flag character, flag
+    string by int flags (`None` if the mapper uses flags higher than
+    16 bits) and int flags by flag string converted so far
+    """
+
+    int_table = {}
+    mask = 0
+    for f_i, f_s in mapper:
+        int_table[f_s] = int_table.get(f_s, 0) | f_i
+        mask |= f_i
+
+    str_table = None
+    if mask.bit_length() <= 16:
+        str_table = [
+            "".join(f_s for f_i, f_s in mapper if f_i and value & f_i == f_i)
+            for value in range(mask + 1)
+        ]
+
+    return (int_table, str_table, {})
+
+
+_DEFAULT_FLAG_TABLES = _build_flag_tables(tuple(const.PERM_STRING_MAP))
+_cached_flag_tables = functools.lru_cache(maxsize=FLAG_MAPPER_CACHE_SIZE)(
+    _build_flag_tables
+)
+
+
+def _flag_tables(mapper: list[tuple[int, str]]) -> tuple:
+    """
+    Returns the lookup tables of a flag mapper, see `int_flags` and
+    `str_flags`
+
+    Tables of `const.PERM_STRING_MAP` are built once, tables of other
+    mappers are cached by the content of the mapper for the last
+    `FLAG_MAPPER_CACHE_SIZE` mappers used.
+
+    **Returns**
+
+    `tuple(<dict>,<list>,<dict>)`: see `_build_flag_tables`
+    """
+    if mapper is const.PERM_STRING_MAP:
+        return _DEFAULT_FLAG_TABLES
+    mapper = tuple(mapper)
+    try:
+        return _cached_flag_tables(mapper)
+    except TypeError:
+        # unhashable mapper entries
+        return _build_flag_tables(mapper)
+
+
 def int_flags(flags: str, mapper: list[tuple[int, str]] = const.PERM_STRING_MAP) -> int:
     """
     Converts string permission flags into integer permission flags as
@@ -43,32 +156,515 @@ def int_flags(flags: str, mapper: list[tuple[int, str]] = const.PERM_STRING_MAP)
     if not isinstance(flags, str):
         raise TypeError("`flags` needs to be a string or integer type")
 
+    if mapper is const.PERM_STRING_MAP:
+        tables = _DEFAULT_FLAG_TABLES
+    else:
+        tables = _flag_tables(mapper)
+    converted = tables[2]
+    try:
+        return converted[flags]
+    except KeyError:
+        pass
+    table = tables[0]
     for f in flags:
-        for f_i, f_s in mapper:
-            if f_s == f:
-                r = r | f_i
+        r |= table.get(f, 0)
+    if len(converted) < FLAG_CACHE_SIZE:
+        converted[flags] = r
     return r
 
 
-class Namespace:
+def int_flags_many(
+    flags: Iterable[str | int], mapper: list[tuple[int, str]] = const.PERM_STRING_MAP
+) -> list[int]:
     """
-    Object representing a permissioning namespace
+    Converts a column of string permission flags into integer permission
+    flags, see `int_flags`
 
-    # Instanced Attributes
+    Each distinct flag string is converted once.
 
-    - length (`int`): namespace key length, number of keys in the namespace
-    - value (`str`): namespace
+    **Arguments**
+
+    - flags (`list<str|int>`)
+    - mapper (`list=const.PERM_STRING_MAP`): see `int_flags`
+
+    **Returns**
+
+    `list<int>`
+    """
+
+    converted = {}
+    r = []
+    for value in flags:
+        try:
+            r.append(converted[value])
+        except KeyError:
+            converted[value] = int_flags(value, mapper)
+            r.append(converted[value])
+        except TypeError:
+            # unhashable, int_flags raises the appropriate error
+            r.append(int_flags(value, mapper))
+    return r
+
+
+def str_flags(flags: int, mapper: list[tuple[int, str]] = const.PERM_STRING_MAP) -> str:
+    """
+    Converts integer permission flags into string permission flags,
+    the inverse of `int_flags`
+
+    Flags are listed in the order of the mapper, flags that are not
+    in the mapper are ignored.
+
+    ??? note "Examples"
+        ```py
+        str_flags(const.PERM_RW) # "crud"
+        str_flags(const.PERM_READ | const.PERM_UPDATE) # "ru"
+        ```
+
+    **Arguments**
+
+    - flags (`int`)
+    - mapper (`list=const.PERM_STRING_MAP`): see `int_flags`
+
+    **Returns**
+
+    `str`
+    """
+
+    if not flags:
+        return ""
+
+    if isinstance(flags, str):
+        return flags
+
+    if not isinstance(flags, int):
+        raise TypeError("`flags` needs to be an integer or string type")
+
+    table = _flag_tables(mapper)[1]
+    if table is not None:
+        return table[flags & (len(table) - 1)]
+    return "".join(f_s for f_i, f_s in mapper if f_i and flags & f_i == f_i)
+
+
+def _readable(value: int | None, level: int = const.PERM_READ) -> bool:
+    """
+    Returns the access map value for a permission index value
+    """
+    return value is not None and (value & level) != 0
+
+
+def _build_access_map(index: dict, level: int = const.PERM_READ) -> dict:
+    """
+    Builds the access map of a permission index for the specified
+    permission flags
+
+    Mirrors the index, each branch holding whether its permission value
+    has any of the flags in `level` under the `__` key.
+
+    **Arguments**
+
+    - index (`dict`): permission index
+
+    **Keyword Arguments**
+
+    - level (`int=PERM_READ`): permission flags
+
+    **Returns**
+
+    `dict`: access map
+    """
+
+    def build(branch_idx: dict) -> dict[str, bool]:
+        r = {"__": _readable(branch_idx["__"], level)}
+        for k, v in list(branch_idx.items()):
+            if k != "__" and k != "__implicit":
+                r[k] = build(v)
+        return r
+
+    return {k: build(v) for k, v in list(index.items())}
+
+
+def _readable_branches(ra_map: dict) -> set[int]:
+    """
+    Returns the ids of the branches of an access map that are
+    accessible along with everything below them
+
+    **Arguments**
+
+    - ra_map (`dict`): access map
+
+    **Returns**
+
+    `set<int>`
+    """
+
+    branches = set()
+
+    def walk(branch: dict) -> bool:
+        readable = branch.get("__", False)
+        for k, child in branch.items():
+            if k != "__" and not walk(child):
+                readable = False
+        if readable:
+            branches.add(id(branch))
+        return readable
+
+    walk(ra_map)
+    return branches
+
+
+def _has_children(branch: dict) -> bool:
+    """
+    Returns whether a permission index branch has any child branches
+    """
+    for k in branch:
+        if k != "__" and k != "__implicit":
+            return True
+    return False
+
+
+def _own_root(root: dict, owned: set | None) -> dict:
+    """
+    Returns the root of a permission index (or read access map) that
+    is about to be changed, copying it first if copy-on-write is in
+    effect and it is not owned yet (see `_own_branch`)
+    """
+    if owned is None or id(root) in owned:
+        return root
+    root = dict(root)
+    owned.add(id(root))
+    return root
+
+
+def _own_branch(parent: dict, key: str, owned: set | None) -> dict:
+    """
+    Returns the child branch stored under key in a branch that is about
+    to be changed
+
+    When `owned` is `None` branches are changed in place. Otherwise
+    copy-on-write is in effect and `owned` holds the ids of the branches
+    that were copied (or created) for the change - any other branch is
+    shared with another version of the index and is copied before it
+    is handed out. `parent` needs to be owned already.
+    """
+    child = parent[key]
+    if owned is None or id(child) in owned:
+        return child
+    child = dict(child)
+    parent[key] = child
+    owned.add(id(child))
+    return child
+
+
+def _propagate_implicit(
+    branch: dict,
+    ra_branch: dict,
+    owned: set | None = None,
+    level: int = const.PERM_READ,
+) -> None:
+    """
+    Passes the permission value of an index branch down to all implied
+    child branches below it, stopping at branches that have their own
+    explicitly set permission value or already hold the value
+    """
+    value = branch["__"]
+    readable = _readable(value, level)
+    for k, child in list(branch.items()):
+        if k == "__" or k == "__implicit" or not child["__implicit"]:
+            continue
+        if child["__"] == value:
+            # implied branches below hold the same value already
+            continue
+        child = _own_branch(branch, k, owned)
+        ra_child = _own_branch(ra_branch, k, owned)
+        child["__"] = value
+        ra_child["__"] = readable
+        _propagate_implicit(child, ra_child, owned, level)
+
+
+def _set_branch(
+    index: dict,
+    ra_map: dict,
+    keys: list[str],
+    value: int | None,
+    owned: set | None = None,
+    level: int = const.PERM_READ,
+) -> tuple[dict, dict]:
+    """
+    Sets the permission value for the specified namespace keys in
+    a permission index and its read access map
+
+    Creates any missing branches along the path and passes the new
+    value down to implied branches below it. The result is identical
+    to rebuilding both with `PermissionSet.update_index`
+
+    **Arguments**
+
+    - index (`dict`): permission index
+    - ra_map (`dict`): read access map of the index
     - keys (`list<str>`): namespace keys
+    - value (`int`): permission flags
+
+    **Keyword Arguments**
+
+    - owned (`set`=None): copy-on-write, see `_own_branch`
+    - level (`int=PERM_READ`): permission flags of the access map
+
+    **Returns**
+
+    `tuple(<dict>,<dict>)`: permission index and read access map, these
+    are copies if copy-on-write is in effect
     """
 
-    def __init__(self, value: list[str] | str, strip: bool = True) -> None:
-        """
-        **Arguments**
+    index = branch = _own_root(index, owned)
+    ra_map = ra_branch = _own_root(ra_map, owned)
+    parent_p = None
+    for k in keys:
+        if k not in branch:
+            branch[k] = {"__": parent_p, "__implicit": True}
+            ra_branch[k] = {"__": _readable(parent_p, level)}
+            if owned is not None:
+                owned.add(id(branch[k]))
+                owned.add(id(ra_branch[k]))
+        branch = _own_branch(branch, k, owned)
+        ra_branch = _own_branch(ra_branch, k, owned)
+        parent_p = branch["__"]
+
+    branch["__"] = value
+    branch["__implicit"] = False
+    ra_branch["__"] = _readable(value, level)
+
+    _propagate_implicit(branch, ra_branch, owned, level)
+
+    return index, ra_map
+
+
+def _remove_branch(
+    index: dict,
+    ra_map: dict,
+    keys: list[str],
+    owned: set | None = None,
+    level: int = const.PERM_READ,
+) -> tuple[dict, dict] | None:
+    """
+    Removes the permission value for the specified namespace keys from
+    a permission index and its read access map
 
-        - value (`list<str>`|`str`): can either be a list containing
-        namespace keys or a str with keys delimited by the `.` character
-        """
-        self.set(value, strip=strip)
+    If the branch still has child branches it is kept as an implied
+    branch, otherwise it is removed along with any implied parent
+    branches that no longer lead anywhere. The result is identical
+    to rebuilding both with `PermissionSet.update_index`
+
+    **Arguments**
+
+    - index (`dict`): permission index
+    - ra_map (`dict`): read access map of the index
+    - keys (`list<str>`): namespace keys
+
+    **Keyword Arguments**
+
+    - owned (`set`=None): copy-on-write, see `_own_branch`
+    - level (`int=PERM_READ`): permission flags of the access map
+
+    **Returns**
+
+    `tuple(<dict>,<dict>)`: permission index and read access map, these
+    are copies if copy-on-write is in effect. `None` if there is no
+    branch for the namespace keys in the index.
+    """
+
+    branch = index
+    for k in keys:
+        if k not in branch:
+            return None
+        branch = branch[k]
+
+    index = branch = _own_root(index, owned)
+    ra_map = ra_branch = _own_root(ra_map, owned)
+    path = [(branch, ra_branch)]
+    for k in keys:
+        branch = _own_branch(branch, k, owned)
+        ra_branch = _own_branch(ra_branch, k, owned)
+        path.append((branch, ra_branch))
+
+    if _has_children(branch):
+        parent_p = path[-2][0].get("__") if len(path) > 2 else None
+        branch["__"] = parent_p
+        branch["__implicit"] = True
+        ra_branch["__"] = _readable(parent_p, level)
+        _propagate_implicit(branch, ra_branch, owned, level)
+        return index, ra_map
+
+    for i in range(len(keys) - 1, -1, -1):
+        parent, ra_parent = path[i]
+        del parent[keys[i]]
+        del ra_parent[keys[i]]
+        if i == 0 or not parent["__implicit"] or _has_children(parent):
+            break
+
+    return index, ra_map
+
+
+def _merge_or(a: int | None, b: int | None) -> int | None:
+    """
+    Combines two permission values for `const.MERGE_OR`
+    """
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a | b
+
+
+# combines the values of two permissions under the same namespace
+# for `PermissionSet.merge`
+_MERGE_STRATEGIES = {
+    const.MERGE_OVERRIDE: lambda a, b: b,
+    const.MERGE_OR: _merge_or,
+}
+
+
+def _merge_index(
+    indexes: list[tuple[dict, dict]],
+    combine: Callable[[int | None, int | None], int | None],
+) -> tuple[dict, dict]:
+    """
+    Merges permission indexes into one in a single pass, along with
+    their read access maps
+
+    A merged branch is explicit if it is explicit in any of the indexes,
+    with its values combined in order, otherwise it is implied from its
+    merged parent branch. Branches found in only one of the indexes are
+    shared with it rather than copied wherever they imply the same
+    values, so the merged index is to be changed with copy-on-write
+    (see `_own_branch`).
+
+    The result is identical to rebuilding the index from the merged
+    permissions as long as none of the indexes holds aliased permissions
+    (see `PermissionSet`).
+
+    **Arguments**
+
+    - indexes (`list<tuple<dict,dict>>`): permission indexes and their
+    read access maps
+    - combine (`function`): combines two explicit permission values
+
+    **Returns**
+
+    `tuple(<dict>,<dict>)`: permission index and read access map
+    """
+
+    def merge(
+        branches: list[tuple[dict, dict, int | None]], parent_p: int | None
+    ) -> tuple[dict, dict]:
+        value = parent_p
+        explicit = False
+        for branch, _, _ in branches:
+            if not branch["__implicit"]:
+                value = combine(value, branch["__"]) if explicit else branch["__"]
+                explicit = True
+        branch = {"__": value, "__implicit": not explicit}
+        ra_branch = {"__": _readable(value)}
+        merge_children(branches, value, branch, ra_branch)
+        return branch, ra_branch
+
+    def merge_children(
+        branches: list[tuple[dict, dict, int | None]],
+        parent_p: int | None,
+        branch: dict,
+        ra_branch: dict,
+    ) -> None:
+        children = {}
+        for other, ra_other, _ in branches:
+            other_p = other.get("__")
+            for k, child in other.items():
+                if k != "__" and k != "__implicit":
+                    children.setdefault(k, []).append((child, ra_other[k], other_p))
+        for k, others in children.items():
+            if len(others) == 1 and others[0][2] == parent_p:
+                branch[k], ra_branch[k] = others[0][0], others[0][1]
+            else:
+                branch[k], ra_branch[k] = merge(others, parent_p)
+
+    index = {}
+    ra_map = {}
+    merge_children(
+        [(index_, ra_map_, None) for index_, ra_map_ in indexes], None, index, ra_map
+    )
+    return index, ra_map
+
+
+def _probe_keys(index: dict, keys: list[str]) -> Iterator[list[str]]:
+    """
+    Yields namespace keys covering every way a namespace can walk
+    through a permission index to the branch for the specified
+    namespace keys and below it, see `PermissionSet.minimize`
+
+    Namespaces that take the same branches at every level get the
+    same permissions, so one namespace is yielded for each distinct
+    set of branches: at every level each key found below the reached
+    branches, a wildcard and a key not found in the index at all. The
+    namespace keys themselves and their parents are yielded first.
+
+    **Arguments**
+
+    - index (`dict`): permission index
+    - keys (`list<str>`): namespace keys of the branch
+    """
+
+    for i in range(len(keys), 0, -1):
+        yield keys[:i]
+
+    # matches nothing but wildcards
+    other = "\x00"
+
+    def walk(path: list[str], branches: list[dict]) -> Iterator[list[str]]:
+        i = len(path)
+        if i < len(keys) and keys[i] != "*":
+            candidates = [keys[i]]
+        else:
+            candidates = {
+                k
+                for branch in branches
+                for k in branch
+                if k != "__" and k != "__implicit"
+            }
+            if not candidates:
+                return
+            candidates.update(("*", other))
+        for key in candidates:
+            reached = []
+            for branch in branches:
+                if key != "*" and key in branch:
+                    reached.append(branch[key])
+                if "*" in branch:
+                    reached.append(branch["*"])
+            yield path + [key]
+            yield from walk(path + [key], reached)
+
+    yield from walk([], [index])
+
+
+def _namespace_value(value: list[str] | tuple[str] | str, strip: bool) -> str:
+    """
+    Returns the normalized string value for a namespace
+    """
+    if isinstance(value, (list, tuple)):
+        value = ".".join([str(v) for v in value])
+    if strip:
+        value = value.rstrip(".*")
+        # namespace was all wildcards
+        if value == "":
+            value = "*"
+    return value
+
+
+class _NamespaceBase:
+    """
+    Behavior shared by `Namespace` and `FrozenNamespace`, which only
+    differ in how they store their attributes
+    """
+
+    __slots__ = ()
 
     def __unicode__(self):
         return self.value
@@ -80,11 +676,7 @@ class Namespace:
         return self.value.__hash__()
 
     def __iter__(self) -> Iterator:
-        yield from self.value.split(".")
-
-    def __setitem__(self, index, value):
-        self.keys[index] = value
-        self.set(".".join(self.keys), strip=self.strip)
+        yield from self.keys
 
     def __getitem__(self, index):
         return self.keys[index]
@@ -92,38 +684,6 @@ class Namespace:
     def __eq__(self, other: Namespace) -> bool:
         return str(self) == str(other)
 
-    def __add__(self, other: Namespace) -> Namespace:
-        if not isinstance(other, Namespace):
-            raise NotImplementedError
-
-        return Namespace(self.keys + other.keys)
-
-    def __iadd__(self, other: Namespace) -> Namespace:
-        return self.__add__(other)
-
-    def set(self, value: list[str] | str, strip: bool = True) -> None:
-        """
-        Set the namespace value
-
-        This is called *automatically* during __init__
-
-        **Arguments**
-
-        - value (`list<str>`|`str`): can either be a list containing
-        namespace keys or a str with keys delimited by the `.` character
-        """
-
-        if isinstance(value, list):
-            value = ".".join([str(v) for v in value])
-        if strip:
-            value = value.rstrip(".*")
-            # namespace was all wildcards
-            if value == "":
-                value = "*"
-        self.value = value
-        self.keys = [k for k in self]
-        self.length = len(self.keys)
-
     def match(self, keys: list[str], partial: bool = True) -> bool:
         """
         Check if the value of this namespace is matched by
@@ -212,574 +772,2988 @@ class Namespace:
         return (root, p[k])
 
 
-class Permission:
+class Namespace(_NamespaceBase, metaclass=abc.ABCMeta):
     """
-    Permission object defined by a namespace and a permission bitmask
+    Object representing a permissioning namespace
 
     # Instanced Attributes
 
-    - namespace (`Namespace`)
-    - value (`int`): permission mask
+    - length (`int`): namespace key length, number of keys in the namespace
+    - value (`str`): namespace
+    - keys (`list<str>`): namespace keys
     """
 
-    def __init__(self, namespace: Namespace | str, value: int | None) -> None:
+    def __init__(self, value: list[str] | str, strip: bool = True) -> None:
         """
         **Arguments**
 
-        - namespace (`str`|`Namespace`)
-        - value (`int`): permission mask
+        - value (`list<str>`|`str`): can either be a list containing
+        namespace keys or a str with keys delimited by the `.` character
         """
-        if isinstance(namespace, str):
-            namespace = Namespace(namespace)
-
-        self.namespace = namespace
-        self.value = value
-
-    def __eq__(self, other: Permission) -> bool:
-        r = other.namespace == self.namespace and other.value == self.value
-        return r
+        self.set(value, strip=strip)
 
-    def has_value(self) -> bool:
+    @classmethod
+    def of(cls, value: list[str] | str | Namespace, strip: bool = True) -> Namespace:
         """
-        Check that value has been set
+        Returns an interned, immutable `FrozenNamespace` for value
 
-        **Returns**
+        Namespaces are cached by value, so repeated calls with
+        the same value return the same object without parsing
+        the value again.
 
-        `bool`: `True` if value has been set, `False` if not
-        """
-        return self.value is not None
+        **Arguments**
 
-    def check(self, level: int) -> bool:
-        """
-        Check if permission mask contains the specified
-        permission level
+        - value (`list<str>`|`tuple<str>`|`str`|`Namespace`)
 
-        **Arguments**
+        **Keyword Arguments**
 
-        - level (`int`): permission flag
+        - strip (`bool=True`): strip trailing wildcards
 
         **Returns**
 
-        `bool`: `True` if flag is contained in mask, `False` if not
+        `FrozenNamespace`
         """
-        if not self.has_value():
-            return False
-        return (self.value & level) != 0
+        if isinstance(value, FrozenNamespace):
+            return value
+        if isinstance(value, _NamespaceBase):
+            value = value.value
+        elif isinstance(value, list):
+            value = tuple(value)
+        return _intern_namespace(value, strip)
+
+    def __setstate__(self, state: dict) -> None:
+        # namespaces pickled by previous versions have no strip
+        self.strip = True
+        self.__dict__.update(state)
 
+    def __setitem__(self, index, value):
+        self.keys[index] = value
+        self.set(".".join(self.keys), strip=self.strip)
 
-class PermissionSet:
-    """
-    Holds a set of Namespaces and permissions to run permission checks
-    on
+    def __add__(self, other: Namespace) -> Namespace:
+        if not isinstance(other, _NamespaceBase):
+            raise NotImplementedError
 
-    Can also be applied to a data dict to remove keys that are not
-    accessible according the permissions in the set
+        return Namespace(list(self.keys) + list(other.keys))
 
-    # Instanced Attributes
+    def __iadd__(self, other: Namespace) -> Namespace:
+        return self.__add__(other)
+
+    def set(self, value: list[str] | str, strip: bool = True) -> None:
+        """
+        Set the namespace value
+
+        This is called *automatically* during __init__
+
+        **Arguments**
+
+        - value (`list<str>`|`str`): can either be a list containing
+        namespace keys or a str with keys delimited by the `.` character
+        """
+
+        self.value = _namespace_value(value, strip)
+        self.keys = self.value.split(".")
+        self.length = len(self.keys)
+        self.strip = strip
+
+
+class FrozenNamespace(_NamespaceBase):
+    """
+    Immutable namespace with its keys stored as a `tuple` and its
+    hash computed once
+
+    Unlike `Namespace` it has no instance `__dict__`, it is still
+    considered an instance of `Namespace` by `isinstance`.
+
+    Use `Namespace.of` to get interned instances.
+    """
+
+    __slots__ = ("value", "keys", "length", "strip", "_hash")
+
+    def __init__(self, value: list[str] | str, strip: bool = True) -> None:
+        _init_frozen_namespace(self, _namespace_value(value, strip), strip)
+
+    @classmethod
+    def _from_value(cls, value: str, strip: bool) -> FrozenNamespace:
+        """
+        Returns a new instance for an already normalized value
+        """
+        namespace = object.__new__(cls)
+        _init_frozen_namespace(namespace, value, strip)
+        return namespace
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("FrozenNamespace is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("FrozenNamespace is immutable")
+
+    def __reduce__(self) -> tuple:
+        return (Namespace.of, (self.value, self.strip))
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __eq__(self, other: Namespace) -> bool:
+        if self is other:
+            return True
+        if isinstance(other, _NamespaceBase):
+            return self.value == other.value
+        return self.value == str(other)
+
+    def __setitem__(self, index, value):
+        raise TypeError("FrozenNamespace is immutable")
+
+    def __add__(self, other: Namespace) -> Namespace:
+        if not isinstance(other, _NamespaceBase):
+            raise NotImplementedError
+
+        return Namespace.of(self.keys + tuple(other.keys))
+
+    def set(self, value: list[str] | str, strip: bool = True) -> None:
+        raise TypeError("FrozenNamespace is immutable")
+
+
+Namespace.register(FrozenNamespace)
+
+# the attributes of `FrozenNamespace` are set through their slots as
+# its `__setattr__` refuses to
+_set_value, _set_keys, _set_length, _set_strip, _set_hash = (
+    getattr(FrozenNamespace, name).__set__ for name in FrozenNamespace.__slots__
+)
+
+
+def _init_frozen_namespace(namespace: FrozenNamespace, value: str, strip: bool) -> None:
+    """
+    Sets the attributes of a new `FrozenNamespace` from its normalized
+    value
+    """
+    keys = tuple(value.split("."))
+    _set_value(namespace, value)
+    _set_keys(namespace, keys)
+    _set_length(namespace, len(keys))
+    _set_strip(namespace, strip)
+    _set_hash(namespace, hash(value))
+
+
+@functools.lru_cache(maxsize=NAMESPACE_CACHE_SIZE)
+def _intern_namespace(value: tuple[str] | str, strip: bool) -> FrozenNamespace:
+    normalized = _namespace_value(value, strip)
+    if normalized != value:
+        # make sure every spelling of a namespace resolves to
+        # the same instance
+        return _intern_namespace(normalized, strip)
+    return FrozenNamespace._from_value(normalized, strip)
+
+
+class Permission:
+    """
+    Permission object defined by a namespace and a permission bitmask
+
+    # Instanced Attributes
+
+    - namespace (`Namespace`)
+    - value (`int`): permission mask
+    """
+
+    def __init__(self, namespace: Namespace | str, value: int | None) -> None:
+        """
+        **Arguments**
+
+        - namespace (`str`|`Namespace`)
+        - value (`int`): permission mask
+        """
+        if isinstance(namespace, str):
+            namespace = Namespace(namespace)
+
+        self.namespace = namespace
+        self.value = value
+
+    def __eq__(self, other: Permission) -> bool:
+        r = other.namespace == self.namespace and other.value == self.value
+        return r
+
+    def has_value(self) -> bool:
+        """
+        Check that value has been set
+
+        **Returns**
+
+        `bool`: `True` if value has been set, `False` if not
+        """
+        return self.value is not None
+
+    def check(self, level: int) -> bool:
+        """
+        Check if permission mask contains the specified
+        permission level
+
+        **Arguments**
+
+        - level (`int`): permission flag
+
+        **Returns**
+
+        `bool`: `True` if flag is contained in mask, `False` if not
+        """
+        if not self.has_value():
+            return False
+        return (self.value & level) != 0
+
+
+class IndexNode:
+    """
+    Immutable node of a compiled permission index
+
+    Compiled from the `dict` based `PermissionSet.index` by
+    `IndexNode.compile`, keeping child branches separate from the
+    permission value and precomputing the wildcard branch.
+
+    # Instanced Attributes
+
+    - children (`dict<str,IndexNode>`): child branches by key, including
+      the wildcard branch, shared and read-only for leaf nodes
+    - wildcard (`IndexNode`|`None`): the `*` child branch
+    - flags (`int`|`None`): permission flags of this branch
+    - implicit (`bool`|`None`): permissions of this branch are implied
+    """
+
+    __slots__ = ("children", "wildcard", "flags", "implicit")
+
+    def __init__(
+        self,
+        children: dict[str, IndexNode],
+        flags: int | None = None,
+        implicit: bool | None = None,
+    ) -> None:
+        object.__setattr__(self, "children", children)
+        object.__setattr__(self, "wildcard", children.get("*"))
+        object.__setattr__(self, "flags", flags)
+        object.__setattr__(self, "implicit", implicit)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("IndexNode is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("IndexNode is immutable")
+
+    @classmethod
+    def compile(cls, branch: dict) -> IndexNode:
+        """
+        Compiles a permission index branch and all branches below it
+
+        **Arguments**
+
+        - branch (`dict`): permission index branch, usually
+        `PermissionSet.index`
+
+        **Returns**
+
+        `IndexNode`
+        """
+        children = {}
+        for k, v in branch.items():
+            if k != "__" and k != "__implicit":
+                children[k] = cls.compile(v)
+        return cls(children or _NO_CHILDREN, branch.get("__"), branch.get("__implicit"))
+
+
+# children of all leaf nodes of compiled indexes, most nodes are leaves
+_NO_CHILDREN = types.MappingProxyType({})
+
+
+# result of a permission index walk that matched nothing
+_NO_MATCH = (None, 0, True)
+
+
+def _select_match(
+    explicit: bool,
+    flags: int | None,
+    i: int,
+    implicit: bool | None,
+    key_flag: int | None,
+    key_pos: int,
+    key_implicit: bool,
+    wc_flag: int | None,
+    wc_pos: int,
+    wc_implicit: bool,
+) -> tuple[int, int, bool]:
+    """
+    Decides between the results of the exact key path and the
+    wildcard path for a single branch during a permission check
+
+    Shared by all permission index walkers so they resolve
+    precedence the same way.
+
+    **Arguments**
+
+    - explicit (`bool`): explicit namespace match is required
+    - flags (`int`): permission flags of the current branch
+    - i (`int`): position of the current branch in the namespace path
+    - implicit (`bool`): permissions of the current branch are implied
+    - key_flag, key_pos, key_implicit: result of the exact key path
+    - wc_flag, wc_pos, wc_implicit: result of the wildcard path
+
+    **Returns**
+
+    `tuple(<int>,<int>,<bool>)`: permission flags, position of the match
+    and whether the matched permissions are implied
+    """
+
+    # explicit namespace match required but not found
+
+    if explicit and key_pos == 0 and wc_pos == 0:
+        return None, i, implicit
+
+    # RETURN wildcard path permission PASS-1
+    # wildcard path produced a permission flag
+
+    if wc_flag is not None and (not explicit or not wc_implicit):
+
+        # RETURN wildcard path permission PASS-1-CHECK-1
+        #
+        # we check if wildcard path length is deeper
+        # than exact match path length.
+
+        if key_pos < wc_pos:
+
+            # 1. wildcard permission is not implied or both wildcard
+            #    and exact permission are implied
+            #
+            # 2. current branch permission is implied or an explicit
+            #    path is required
+
+            if (not wc_implicit or key_implicit) and (implicit or explicit):
+                return wc_flag, wc_pos, wc_implicit
+
+        # RETURN wildcard path permission PASS-1-CHECK-2
+        #
+        # 1. exact key path has NOT produced a permission
+        #
+        # 2. current branch permission is implied or an explicit
+        #    path is required
+
+        if key_flag is None and (implicit or explicit):
+            return wc_flag, wc_pos, wc_implicit
+
+    # RETURN exact path permission PASS-1
+    # exact key path produced a permission flag
+
+    if key_flag is not None and (not explicit or not key_implicit):
+
+        # RETURN exact key path permission PASS-1-CHECK-1
+        #
+        # if the exact path permission is not implied or the
+        # current permission is also implied
+
+        if not key_implicit or implicit:
+            return key_flag, key_pos, key_implicit
+
+        # RETURN exact key path permission PASS-1-CHECK-2
+        #
+        # if there are no flags on the current branch (first match)
+        if flags is None:
+            return key_flag, key_pos, key_implicit
+
+    # RETURN wildcard path permission PASS-2
+    # wildcard produced a permission flag, lets check against
+    # current branch
+
+    if wc_flag is not None and (not explicit or not wc_implicit):
+
+        # RETURN wildcard path permission PASS-2-CHECK-1
+        #
+        # if the wildcard path permission is not implied or the
+        # current permission is also implied
+
+        if not wc_implicit or implicit:
+            return wc_flag, wc_pos, wc_implicit
+
+        # RETURN wildcard path permission PASS-1-CHECK-2
+        #
+        # if there are no flags on the current branch (first match)
+
+        if flags is None:
+            return wc_flag, wc_pos, wc_implicit
+
+    # following neither wildard nor exact match produced
+    # a permission flag, return current branch permissions
+
+    return flags, i, implicit
+
+
+class DecisionCache:
+    """
+    Bounded least recently used cache for permission check results
+
+    Tied to the generation of the `PermissionSet` it is caching for,
+    all entries are dropped as soon as a lookup is made for a different
+    generation.
+
+    # Instanced Attributes
+
+    - maxsize (`int`): maximum number of cached results
+    - generation (`int`): permission set generation the cached
+      results belong to
+    - hits (`int`): number of lookups that found a cached result
+    - misses (`int`): number of lookups that did not
+    - evictions (`int`): number of results dropped to make room
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        """
+        **Arguments**
+
+        - maxsize (`int`): maximum number of cached results
+        """
+        self.maxsize = maxsize
+        self.generation = None
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def get(self, key: Hashable, generation: int) -> Any:
+        """
+        Returns the cached result for key
+
+        **Arguments**
+
+        - key (`hashable`)
+        - generation (`int`): current generation of the permission set
+
+        **Returns**
+
+        cached result or `None` if nothing is cached for key
+        """
+        if generation != self.generation:
+            self.data.clear()
+            self.generation = generation
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, generation: int) -> None:
+        """
+        Caches a result for key, evicting the least recently used
+        result if the cache is full
+
+        **Arguments**
+
+        - key (`hashable`)
+        - value
+        - generation (`int`): generation of the permission set the
+          result was computed for, results for a different generation
+          than the cached ones are not stored
+        """
+        if generation != self.generation:
+            return
+        self.data[key] = value
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Drops all cached results
+        """
+        self.data.clear()
+
+    def info(self) -> dict[str, int]:
+        """
+        Returns cache counters
+
+        **Returns**
+
+        `dict`: `hits`, `misses`, `evictions`, `size` and `maxsize`
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.data),
+            "maxsize": self.maxsize,
+        }
+
+
+class _IndexState:
+    """
+    Permissions and permission index of a `PermissionSet` at one point
+    in time, along with everything derived from them
+
+    A permission set publishes a new state for every change by replacing
+    its state in a single assignment. Once published a state is only
+    changed in place by the next change if no snapshot of it was taken
+    (see `PermissionSet.snapshot`), otherwise the next change copies
+    whatever it touches.
+
+    # Instanced Attributes
+
+    - permissions (`dict`)
+    - aliased (`set`): see `PermissionSet`
+    - index (`dict`)
+    - read_access_map (`dict`)
+    - generation (`int`)
+    - owned (`set`|`None`): copy-on-write while the state is being
+      changed, see `_own_branch`. Kept across changes by states sharing
+      branches with other permission sets.
+    - shared (`bool`): a snapshot was taken of this state
+    - unindexed (`bool`): permissions were changed without updating the
+      index (see `PermissionSet.__setitem__`), the next change rebuilds it
+    """
+
+    __slots__ = (
+        "permissions",
+        "aliased",
+        "index",
+        "read_access_map",
+        "generation",
+        "owned",
+        "shared",
+        "unindexed",
+        "compiled_index",
+        "access_maps",
+        "readable",
+    )
+
+    def __init__(
+        self,
+        permissions: dict,
+        aliased: set,
+        index: dict,
+        read_access_map: dict,
+        generation: int = 0,
+    ) -> None:
+        self.permissions = permissions
+        self.aliased = aliased
+        self.index = index
+        self.read_access_map = read_access_map
+        self.generation = generation
+        self.owned = None
+        self.shared = False
+        self.unindexed = False
+        self.compiled_index = None
+        self.access_maps = {}
+        self.readable = {}
+
+    def evolve(self, copy: bool = False) -> _IndexState:
+        """
+        Returns the state to apply the next change to
+
+        **Keyword Arguments**
+
+        - copy (`bool=False`): copy whatever the change touches even
+          if no snapshot was taken of this state
+
+        **Returns**
+
+        `_IndexState`
+        """
+        if not self.shared and not copy:
+            state = _IndexState(
+                self.permissions,
+                self.aliased,
+                self.index,
+                self.read_access_map,
+                self.generation + 1,
+            )
+            # branches shared with base sets (see `OverlayPermissionSet`)
+            # are still copied on write
+            state.owned = self.owned
+            state.unindexed = self.unindexed
+            return state
+        state = _IndexState(
+            self.permissions.copy(),
+            set(self.aliased),
+            self.index,
+            self.read_access_map,
+            self.generation + 1,
+        )
+        state.owned = set()
+        state.unindexed = self.unindexed
+        return state
+
+    def compiled(self) -> IndexNode:
+        """
+        Returns the compiled index, compiling it on first use
+        """
+        if self.compiled_index is None:
+            self.compiled_index = IndexNode.compile(self.index)
+        return self.compiled_index
+
+    def access_map(self, level: int) -> dict:
+        """
+        Returns the access map for `level`, building it on first use
+        """
+        if level == const.PERM_READ:
+            return self.read_access_map
+        access_map = self.access_maps.get(level)
+        if access_map is None:
+            access_map = _build_access_map(self.index, level)
+            self.access_maps[level] = access_map
+        return access_map
+
+    def readable_branches(self, level: int) -> set[int]:
+        """
+        Returns the ids of the branches of the access map for `level`
+        that are accessible along with everything below them, walking
+        the access map on first use
+        """
+        branches = self.readable.get(level)
+        if branches is None:
+            branches = _readable_branches(self.access_map(level))
+            self.readable[level] = branches
+        return branches
+
+
+class PermissionSet:
+    """
+    Holds a set of Namespaces and permissions to run permission checks
+    on
+
+    Can also be applied to a data dict to remove keys that are not
+    accessible according the permissions in the set
+
+    # Instanced Attributes
+
+    - compiled (`bool`): run permission checks against `compiled_index`
+    - cache (`DecisionCache`|`None`): `get_permissions` result cache
+
+    # Properties
 
     - permissions (`dict`): permissions in this set
     - index (`dict`): permission index
-    - read_access_map (`dict`)
+    - read_access_map (`dict`): access map for `PERM_READ`, see
+      `access_map`
+    - generation (`int`): incremented every time the set is changed
+
+    Setting `permissions`, `index` or `read_access_map` is published as
+    a change, permissions set this way are indexed by the next change
+    or `update_index`.
+
+    Changes are published in a single step, one `update` is published
+    as one change. Use `snapshot` to read from a permission set that
+    is changed by another thread.
     """
 
-    def __init__(self, rules: dict[str, int] | list[Permission] | None = None) -> None:
+    def __init__(
+        self,
+        rules: dict[str, int] | list[Permission] | None = None,
+        compiled: bool = False,
+        cache_size: int = 0,
+    ) -> None:
+        """
+        **Keyword Arguments**
+
+        - rules (`list<Permission>`|`dict<str,int>`): list of `Permission` objects
+        or `dict` of `namspace(str)`:`permission(int)` pairs
+        - compiled (`bool=False`): run permission checks against the compiled
+        index (see `compiled_index`)
+        - cache_size (`int=0`): if set, cache up to this many
+        `get_permissions` results (see `DecisionCache`)
+        """
+
+        if rules is None:
+            rules = []
+
+        self.compiled = compiled
+        self.cache = DecisionCache(cache_size) if cache_size else None
+
+        # the aliased keys of the state are keys that do not match
+        # the string value of the namespace of the permission stored
+        # under them (e.g., "a.*" or a `Permission` stored under a
+        # different key). While any of these exist the index is rebuilt
+        # in full on every change since their position in the index
+        # depends on sort order.
+        self._state = _IndexState({}, set(), {}, {})
+        self._pending = None
+        self._lock = threading.RLock()
+        self._stats = None
+
+        with self._write():
+            if type(rules) == list:
+                for permission in rules:
+                    self.__add__(permission)
+            elif type(rules) == dict:
+                for ns, p in list(rules.items()):
+                    self.__add__(Permission(ns, p))
+
+    @contextlib.contextmanager
+    def _write(self, copy: bool = False) -> Iterator[_IndexState]:
+        """
+        Context manager for changes to the permission set, yields the
+        state to change and publishes it once all changes are done
+
+        Changes are serialized by a lock, nested changes are published
+        along with the outermost one. Nothing is published if an
+        exception is raised.
+
+        The current state is changed in place unless a snapshot was taken
+        of it or `copy` is set, in which case changes are not visible
+        before they are published and are dropped on exceptions.
+        """
+        with self._lock:
+            if self._pending is not None:
+                yield self._pending
+                return
+            self._pending = self._state.evolve(copy)
+            try:
+                yield self._pending
+                self._state = self._pending
+            finally:
+                self._pending = None
+
+    @property
+    def permissions(self) -> dict:
+        return self._state.permissions
+
+    @permissions.setter
+    def permissions(self, permissions: dict) -> None:
+        # indexed by the next change or `update_index`, same as
+        # permissions set with `reindex=False`
+        with self._write(copy=True) as state:
+            state.permissions = permissions
+            state.aliased = {
+                key
+                for key, permission in permissions.items()
+                if str(permission.namespace) != key
+            }
+            state.unindexed = True
+
+    @property
+    def index(self) -> dict:
+        return self._state.index
+
+    @index.setter
+    def index(self, index: dict) -> None:
+        with self._write(copy=True) as state:
+            state.index = index
+
+    @property
+    def read_access_map(self) -> dict:
+        return self._state.read_access_map
+
+    @read_access_map.setter
+    def read_access_map(self, read_access_map: dict) -> None:
+        with self._write(copy=True) as state:
+            state.read_access_map = read_access_map
+
+    @property
+    def generation(self) -> int:
+        return self._state.generation
+
+    def snapshot(self) -> FrozenPermissionSet:
+        """
+        Returns an immutable view of the current state of this set
+
+        The view never changes, changes to this set made afterwards
+        copy whatever they touch instead of changing it in place. Taking
+        a snapshot is cheap and reading from one never takes a lock.
+
+        **Returns**
+
+        `FrozenPermissionSet`
+        """
+        state = self._state
+        if not state.shared:
+            # wait for a change that may be updating the state in place
+            with self._lock:
+                state = self._state
+                state.shared = True
+        return FrozenPermissionSet._of(state, self.compiled)
+
+    def access_map(self, level: int = const.PERM_READ) -> dict:
+        """
+        Returns the access map for the specified permission flags
+
+        The access map mirrors the permission index, each branch holding
+        whether its namespace has any of the flags in `level`. The map
+        for `PERM_READ` is `read_access_map`, maps for other flags are
+        built on first use and kept until the permission set changes.
+
+        **Keyword Arguments**
+
+        - level (`int=PERM_READ`): permission flags, `PERM_UPDATE` for
+        example
+
+        **Returns**
+
+        `dict`: access map
+        """
+        return self._state.access_map(level)
+
+    def cache_info(self) -> dict[str, int]:
+        """
+        Returns hit, miss and eviction counters of the `get_permissions`
+        result cache
+
+        **Returns**
+
+        `dict`: empty if caching is not enabled
+        """
+        if self.cache is None:
+            return {}
+        return self.cache.info()
+
+    def instrument(
+        self,
+        enabled: bool = True,
+        callback: Callable[[str, float], None] | None = None,
+    ) -> None:
+        """
+        Enables or disables counting and timing of the work done by
+        this set, see `stats`
+
+        Instrumentation wraps the methods of this set on the instance,
+        so a set that is not instrumented runs the same code as before.
+        Enabling it again resets the counters. Counters are not
+        synchronized, counts from several threads may be lost.
+
+        **Keyword Arguments**
+
+        - enabled (`bool=True`)
+        - callback (`function=None`): called with the name (`str`) and
+        duration in seconds (`float`) of every instrumented call, for
+        example to export them to a metrics system. Names are
+        `get_permissions`, `check`, `expand`, `update_index`, `apply` and
+        `rebuild` (full index rebuilds)
+        """
+
+        for name in _INSTRUMENTED:
+            self.__dict__.pop(name, None)
+        self._stats = None
+        if not enabled:
+            return
+
+        names = ["get_permissions", "check", "expand", "update_index", "apply"]
+        stats = dict.fromkeys(names + ["rebuild"], 0)
+        stats.update((f"{name}_time", 0.0) for name in names + ["rebuild"])
+        stats.update(nodes=0, wildcards=0, expanded=0)
+        timer = time.perf_counter
+
+        def timed(name: str, method: Callable) -> Callable:
+            @functools.wraps(method)
+            def wrapper(*args, **kwargs):
+                t = timer()
+                try:
+                    result = method(*args, **kwargs)
+                finally:
+                    elapsed = timer() - t
+                    stats[name] += 1
+                    stats[f"{name}_time"] += elapsed
+                    if callback is not None:
+                        callback(name, elapsed)
+                if name == "expand":
+                    stats["expanded"] += len(result)
+                return result
+
+            return wrapper
+
+        for name in names:
+            setattr(self, name, timed(name, getattr(self, name)))
+        self._index_rebuild = timed("rebuild", self._index_rebuild)
+
+        check = self._check
+        check_compiled = self._check_compiled
+        check_many = self._check_many
+
+        @functools.wraps(check)
+        def _check(keys, branch, flags=None, i=0, explicit=False, length=0):
+            stats["nodes"] += 1
+            if i < len(keys) and keys[i] != "*" and "*" in branch:
+                stats["wildcards"] += 1
+            return check(keys, branch, flags, i, explicit, length)
+
+        @functools.wraps(check_compiled)
+        def _check_compiled(keys, node, i=0, explicit=False, length=0):
+            stats["nodes"] += 1
+            if i < len(keys) and keys[i] != "*" and node.wildcard is not None:
+                stats["wildcards"] += 1
+            return check_compiled(keys, node, i, explicit, length)
+
+        @functools.wraps(check_many)
+        def _check_many(*args, **kwargs):
+            stats["nodes"] += 1
+            return check_many(*args, **kwargs)
+
+        self._check = _check
+        self._check_compiled = _check_compiled
+        self._check_many = _check_many
+        self._stats = stats
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Returns the counters collected since instrumentation was enabled,
+        see `instrument`
+
+        - `get_permissions`, `check`, `expand`, `update_index`, `apply`:
+          number of calls, `check` resolves through `get_permissions`
+        - `<name>_time`: total duration of these calls in seconds
+        - `rebuild`, `rebuild_time`: full rebuilds of the permission index
+        - `nodes`: permission index branches visited by checks
+        - `wildcards`: wildcard branches followed by checks
+        - `expanded`: namespaces returned by `expand`
+        - `cache_hits`, `cache_misses`: see `cache_info`, only present if
+          caching is enabled
+
+        **Returns**
+
+        `dict`: empty if instrumentation is not enabled
+        """
+        if self._stats is None:
+            return {}
+        stats = dict(self._stats)
+        if self.cache is not None:
+            stats.update(cache_hits=self.cache.hits, cache_misses=self.cache.misses)
+        return stats
+
+    def compile_template(
+        self, template: str, explicit: bool = False
+    ) -> NamespaceTemplate:
+        """
+        Returns a checker for namespaces following a template, see
+        `NamespaceTemplate`
+
+        ??? note "Examples"
+            ```py
+            template = pset.compile_template("org.{}.net.{}")
+            template((org_id, net_id)) # same as pset.get_permissions(f"org.{org_id}.net.{net_id}")
+            template.check((org_id, net_id), const.PERM_READ)
+            template.many([(1, 2), (1, 3)])
+            ```
+
+        **Arguments**
+
+        - template (`str`): namespace with `{}` for each variable key
+
+        **Keyword Arguments**
+
+        - explicit (`bool=False`): require explicitly set permissions
+
+        **Returns**
+
+        `NamespaceTemplate`
+        """
+        return NamespaceTemplate(self, template, explicit=explicit)
+
+    @property
+    def compiled_index(self) -> IndexNode:
+        """
+        Compiled (`IndexNode`) version of the permission index
+
+        Compiled on first access and again after the permission
+        set is changed
+        """
+        return self._state.compiled()
+
+    @property
+    def namespaces(self) -> list[str]:
+        """
+        `list` of all namespaces registered in this permission set
+        """
+        return list(self.permissions.keys())
+
+    def __iter__(self):
+        yield from list(self.permissions.values())
+
+    def __contains__(self, item: str) -> bool:
+        return item in self.permissions
+
+    def __radd__(self, other):
+        self.__add__(other)
+
+    def __add__(self, other: Permission) -> None:
+        if isinstance(other, Permission):
+            self.__setitem__(str(other.namespace), other)
+
+    def __setitem__(
+        self, key: str, other: Permission | int, reindex: bool = True
+    ) -> None:
+        if isinstance(other, Permission):
+            permission = other
+        elif isinstance(other, int):
+            permission = Permission(key, other)
+        else:
+            raise TypeError(
+                "Value needs to be a Permission instance or a permission flag"
+            )
+
+        with self._write() as state:
+            state.permissions[key] = permission
+
+            # full rebuild is required if the key was or is aliased, or
+            # earlier changes were not indexed
+            rebuild = key in state.aliased or state.unindexed
+            if str(permission.namespace) != key:
+                state.aliased.add(key)
+            else:
+                state.aliased.discard(key)
+
+            if not reindex:
+                state.unindexed = True
+                return
+
+            if rebuild or state.aliased:
+                self._index_rebuild(state)
+            else:
+                self._index_set(state, permission.namespace.keys, permission.value)
+
+    def __delitem__(self, namespace: str) -> None:
+        with self._write() as state:
+            if namespace in state.permissions:
+                permission = state.permissions.pop(namespace)
+            else:
+                raise KeyError(
+                    "No permission registered under namespace '%s'" % namespace
+                )
+
+            if state.aliased or state.unindexed:
+                state.aliased.discard(namespace)
+                self._index_rebuild(state)
+            else:
+                self._index_remove(state, permission.namespace.keys)
+
+    def update(self, permissions: dict, override: bool = True) -> None:
+        """
+        Update the permissionset with a dict of namespace<str>:permission<Permission|int|long>
+        pairs
+
+        ??? note "Examples"
+            ```py
+            pset.update(
+              {
+                "a" : const.PERM_READ,
+                "b" : Permission("b", const.PERM_RW)
+              }
+            )
+            ```
+
+        **Arguments**
+
+        - permissions (`dict`): dict mapping namespaces (`str`) to permission (`Permission` or `int`)
+        - override (`bool`=True): if True will override existing namespaces if they exist
+        """
+        with self._write(copy=True) as state:
+            # the index is rebuilt once for all of them if any key is
+            # aliased, see `__setitem__`
+            rebuild = state.unindexed or bool(state.aliased)
+            keys = []
+            for k, v in list(permissions.items()):
+                if not override and k in state.permissions:
+                    continue
+                self.__setitem__(k, v, reindex=False)
+                keys.append(k)
+
+            if rebuild or state.aliased:
+                self._index_rebuild(state)
+                return
+
+            state.unindexed = False
+            for k in keys:
+                permission = state.permissions[k]
+                self._index_set(state, permission.namespace.keys, permission.value)
+
+    @classmethod
+    def merge(
+        cls,
+        *sets: PermissionSet,
+        strategy: str = const.MERGE_OVERRIDE,
+        compiled: bool = False,
+        cache_size: int = 0,
+    ) -> PermissionSet:
+        """
+        Creates a permission set combining the permissions of the specified
+        sets, the permission indexes of the sets are merged directly
+        instead of being rebuilt from the combined permissions
+
+        ??? note "Examples"
+            ```py
+            pset = PermissionSet.merge(*groups, strategy=const.MERGE_OR)
+            pset = group_a | group_b
+            ```
+
+        **Arguments**
+
+        - sets (`PermissionSet`): permission sets, in order
+
+        **Keyword Arguments**
+
+        - strategy (`str=MERGE_OVERRIDE`): how permissions under the same
+        namespace are combined, `const.MERGE_OVERRIDE` to use the one of
+        the later set, `const.MERGE_OR` to combine their flags
+        - compiled (`bool=False`): see `PermissionSet`
+        - cache_size (`int=0`): see `PermissionSet`
+
+        **Returns**
+
+        `PermissionSet`
+        """
+
+        try:
+            combine = _MERGE_STRATEGIES[strategy]
+        except KeyError:
+            raise ValueError(f"Unknown merge strategy: {strategy}")
+
+        # branches are shared with the sets, which copy them on write
+        # from now on (see `snapshot`)
+        states = [pset.snapshot()._state for pset in sets]
+
+        permissions = {}
+        for state in states:
+            for key, permission in state.permissions.items():
+                if key in permissions:
+                    value = combine(permissions[key].value, permission.value)
+                    if value != permission.value:
+                        permission = Permission(permission.namespace, value)
+                permissions[key] = permission
+
+        pset = cls(compiled=compiled, cache_size=cache_size)
+        with pset._write() as merged:
+            merged.permissions = permissions
+            merged.aliased = {
+                key
+                for state in states
+                for key in state.aliased
+                if str(permissions[key].namespace) != key
+            }
+            if any(state.aliased or state.unindexed for state in states):
+                # placement of aliased permissions depends on the
+                # order of all permissions, permissions that were not
+                # indexed yet are not in the indexes to merge
+                pset._index_rebuild(merged)
+            else:
+                merged.index, merged.read_access_map = _merge_index(
+                    [(state.index, state.read_access_map) for state in states],
+                    combine,
+                )
+                merged.owned = set()
+        return pset
+
+    def __or__(self, other: PermissionSet) -> PermissionSet:
+        if not isinstance(other, PermissionSet):
+            return NotImplemented
+        return PermissionSet.merge(
+            self,
+            other,
+            compiled=self.compiled,
+            cache_size=self.cache.maxsize if self.cache is not None else 0,
+        )
+
+    def apply_delta(
+        self,
+        added: dict | None = None,
+        changed: dict | None = None,
+        removed: Iterable[str] | None = None,
+    ) -> set[str]:
+        """
+        Applies added, changed and removed permissions to the set as a
+        single change, updating the permission index in place of
+        rebuilding it, and returns the namespaces whose effective
+        permissions changed
+
+        Each returned namespace stands for itself and everything below
+        it, a cached decision for a namespace is stale if
+        `Namespace(namespace).match(prefix.split("."))` is true for
+        any of them. Only permissions whose index branches actually
+        changed are reported and namespaces below another returned
+        namespace are left out.
+
+        ??? note "Examples"
+            ```py
+            prefixes = pset.apply_delta(
+                added={"a.b": const.PERM_READ},
+                changed={"c": const.PERM_RW},
+                removed=["d.e"],
+            )
+            ```
+
+        **Keyword Arguments**
+
+        - added (`dict`): namespaces (`str`) mapped to permission
+        (`Permission` or `int`) to add
+        - changed (`dict`): namespaces mapped to permission to replace
+        existing permissions with, raises a `KeyError` if there is no
+        permission under a namespace
+        - removed (`list<str>`): namespaces to remove, raises a `KeyError`
+        if there is no permission under a namespace
+
+        Removals are applied first, then changes and additions. Nothing
+        is applied if an error is raised.
+
+        **Returns**
+
+        `set<str>`: namespaces whose effective permissions changed
+        """
+
+        touched = set()
+        with self._write(copy=True) as state:
+            # not changed by the delta, see `_write`
+            previous = self._state
+
+            for key in removed or []:
+                if key in state.permissions:
+                    touched.add(tuple(state.permissions[key].namespace.keys))
+                del self[key]
+
+            for key, value in list((changed or {}).items()):
+                if key not in state.permissions:
+                    raise KeyError(
+                        "No permission registered under namespace '%s'" % key
+                    )
+                touched.add(tuple(state.permissions[key].namespace.keys))
+                self[key] = value
+                touched.add(tuple(state.permissions[key].namespace.keys))
+
+            for key, value in list((added or {}).items()):
+                if key in state.permissions:
+                    touched.add(tuple(state.permissions[key].namespace.keys))
+                self[key] = value
+                touched.add(tuple(state.permissions[key].namespace.keys))
+
+        def value(index: dict, keys: tuple[str]) -> tuple | None:
+            branch = index
+            for k in keys:
+                if k not in branch:
+                    return None
+                branch = branch[k]
+            return branch["__"], branch["__implicit"]
+
+        changed_keys = {
+            keys
+            for keys in touched
+            if value(previous.index, keys) != value(state.index, keys)
+        }
+        return {
+            ".".join(keys)
+            for keys in changed_keys
+            if not any(keys[:i] in changed_keys for i in range(1, len(keys)))
+        }
+
+    def minimize(self, explicit: bool = True) -> tuple[PermissionSet, int]:
+        """
+        Returns an equivalent permission set without the permissions
+        that are redundant given the other permissions, along with the
+        number of permissions left out
+
+        A permission is left out if doing so does not change the result
+        of `get_permissions` for any namespace. Permissions are tried
+        deepest first, each removal is verified against this set for
+        every distinct way a namespace can walk through the permission
+        index to the permission (see `_probe_keys`). The number of these
+        grows with the number of index branches a permission shares its
+        namespaces with through wildcards.
+
+        With `explicit` set, results of `get_permissions(...,
+        explicit=True)` are kept the same as well, which keeps any
+        permission that makes its namespace explicit unless a wildcard
+        sibling with the same permissions does so as well. With
+        `explicit=False` only the results of implicit checks are kept,
+        which also leaves out permissions that merely repeat the
+        permissions of their parent namespace (e.g., `a.b` = 1 under
+        `a` = 1).
+
+        ??? note "Examples"
+            ```py
+            pset, removed = pset.minimize(explicit=False)
+            ```
+
+        **Keyword Arguments**
+
+        - explicit (`bool=True`): keep results of explicit checks the same
+
+        **Returns**
+
+        `tuple(<PermissionSet>,<int>)`: the minimized set and the number
+        of permissions left out
+        """
+
+        # read once, this set may be changed by another thread
+        state = self._state
+        index = state.index
+        modes = [False, True] if explicit else [False]
+
+        pset = PermissionSet(
+            compiled=self.compiled,
+            cache_size=self.cache.maxsize if self.cache is not None else 0,
+        )
+        with pset._write() as work:
+            work.permissions = dict(state.permissions)
+            work.aliased = set(state.aliased)
+            pset._index_rebuild(work)
+
+        def equivalent(keys: list[str]) -> bool:
+            work_index = pset._state.index
+            for probe in _probe_keys(index, keys):
+                for mode in modes:
+                    if self._resolve(probe, work_index, mode) != self._resolve(
+                        probe, index, mode
+                    ):
+                        return False
+            return True
+
+        removed = 0
+        for key, permission in sorted(
+            state.permissions.items(), key=lambda item: -len(item[1].namespace.keys)
+        ):
+            del pset[key]
+            if equivalent(permission.namespace.keys):
+                removed += 1
+            else:
+                pset[key] = permission
+
+        return pset, removed
+
+    def analyze(self) -> dict:
+        """
+        Returns figures on the size of the permission index and the
+        cost of checking permissions against it, for example to flag
+        rule sets that are expensive to check before using them
+
+        - `permissions` (`int`): number of permissions
+        - `nodes` (`int`): number of index branches
+        - `depth` (`int`): number of keys of the longest namespace
+        - `fanout` (`dict<int,int>`): number of branches by their number
+          of child branches
+        - `max_fanout` (`int`)
+        - `wildcards` (`dict<int,int>`): number of wildcard branches by
+          the position of the wildcard in the namespace
+        - `max_visits` (`int`): upper bound of the number of branches a
+          single check visits (see `_check`)
+        - `max_paths` (`int`): upper bound of the number of branch paths
+          a single check follows at once
+        - `memory` (`int`): estimated memory taken up by `index` and
+          `read_access_map` in bytes
+
+        ??? note "Examples"
+            ```py
+            if pset.analyze()["max_visits"] > 1000:
+                raise ValueError("rules are too expensive to check")
+            ```
+
+        **Returns**
+
+        `dict`
+        """
+
+        # read once, this set may be changed by another thread
+        state = self._state
+
+        fanout = {}
+        wildcards = {}
+        nodes = 0
+        depth = 0
+        memory = 0
+
+        def walk(branch: dict, ra_branch: dict, i: int) -> tuple[int, int]:
+            """
+            Counts the branches below `branch` and returns the maximum
+            number of branches visited and paths followed below it
+            """
+            nonlocal nodes, depth, memory
+            memory += sys.getsizeof(branch) + sys.getsizeof(ra_branch)
+            children = [k for k in branch if k != "__" and k != "__implicit"]
+            fanout[len(children)] = fanout.get(len(children), 0) + 1
+            depth = max(depth, i)
+
+            results = {}
+            for k in children:
+                nodes += 1
+                if k == "*":
+                    wildcards[i] = wildcards.get(i, 0) + 1
+                results[k] = walk(branch[k], ra_branch[k], i + 1)
+
+            # a check either ends here, follows the wildcard branch only
+            # or a key branch along with the wildcard branch
+            wc_visits, wc_paths = results.pop("*", (0, 0))
+            visits, paths = wc_visits, max(wc_paths, 1)
+            for k_visits, k_paths in results.values():
+                visits = max(visits, k_visits + wc_visits)
+                paths = max(paths, k_paths + wc_paths)
+            return visits + 1, paths
+
+        max_visits, max_paths = walk(state.index, state.read_access_map, 0)
+
+        # the root is not a branch of its own
+        fanout[len(state.index)] -= 1
+        if not fanout[len(state.index)]:
+            del fanout[len(state.index)]
+
+        return {
+            "permissions": len(state.permissions),
+            "nodes": nodes,
+            "depth": depth,
+            "fanout": dict(sorted(fanout.items())),
+            "max_fanout": max(fanout, default=0),
+            "wildcards": dict(sorted(wildcards.items())),
+            "max_visits": max_visits,
+            "max_paths": max_paths,
+            "memory": memory,
+        }
+
+    def update_index(self) -> dict:
+        """
+        Regenerates the permission index for this set
+
+        Called everytime a rule is added / removed / modified in
+        the set
+        """
+
+        with self._write() as state:
+            self._index_rebuild(state)
+        return state.index
+
+    def _index_rebuild(self, state: _IndexState) -> None:
+        """
+        Rebuilds the permission index and read access map of a state
+        from its permissions
+        """
+
+        # update index
+
+        idx = {}
+        for _, p in sorted(list(state.permissions.items()), key=lambda x: str(x[0])):
+            branch = idx
+            parent_p = None
+            for k in p.namespace.keys:
+
+                if k not in branch:
+                    branch[k] = {"__": parent_p}
+                    branch[k].update(__implicit=True)
+
+                branch = branch[k]
+                parent_p = branch["__"]
+            branch["__"] = p.value
+            branch["__implicit"] = False
+
+        state.index = idx
+
+        # update read access map
+
+        state.read_access_map = _build_access_map(idx)
+
+        # both are new, nothing to copy-on-write
+        state.owned = None
+        state.unindexed = False
+
+    def dumps(self) -> bytes:
+        """
+        Serializes the permissions and permission index of this set
+        to a compact binary form, see `loads`
+
+        **Returns**
+
+        `bytes`
+        """
+
+        strings = {}
+
+        def string(value: str) -> int:
+            try:
+                return strings[value]
+            except KeyError:
+                strings[value] = len(strings)
+                return strings[value]
+
+        permissions = []
+        for key, permission in self.permissions.items():
+            flags = _DUMP_STRIP if permission.namespace.strip else 0
+            if permission.value is not None:
+                flags |= _DUMP_HAS_VALUE
+            permissions.append(
+                _DUMP_PERMISSION.pack(
+                    string(key),
+                    string(permission.namespace.value),
+                    flags,
+                    permission.value or 0,
+                )
+            )
+
+        branches = []
+
+        def dump_branch(key: str, branch: dict) -> None:
+            children = [k for k in branch if k != "__" and k != "__implicit"]
+            flags = _DUMP_IMPLICIT if branch["__implicit"] else 0
+            if branch["__"] is not None:
+                flags |= _DUMP_HAS_VALUE
+            branches.append(
+                _DUMP_BRANCH.pack(string(key), flags, branch["__"] or 0, len(children))
+            )
+            for k in children:
+                dump_branch(k, branch[k])
+
+        for key, branch in self.index.items():
+            dump_branch(key, branch)
+
+        # strings are stored as their lengths (in characters) followed
+        # by all of them encoded at once
+
+        data = "".join(strings).encode("utf-8")
+        return b"".join(
+            [
+                _DUMP_HEADER.pack(
+                    _DUMP_MAGIC,
+                    _DUMP_VERSION,
+                    len(strings),
+                    len(data),
+                    len(permissions),
+                    len(branches),
+                    len(self.index),
+                ),
+                struct.pack(f"<{len(strings)}I", *(len(v) for v in strings)),
+                data,
+            ]
+            + permissions
+            + branches
+        )
+
+    @classmethod
+    def loads(
+        cls,
+        data: bytes | bytearray | memoryview,
+        compiled: bool = False,
+        cache_size: int = 0,
+    ) -> PermissionSet:
+        """
+        Creates a permission set from the binary form written by `dumps`
+
+        The permission index is loaded as it was dumped instead of being
+        rebuilt from the permissions. Any object supporting the buffer
+        protocol can be passed, including an `mmap.mmap` of a dump file,
+        which is read in place without being copied into memory first.
+
+        ??? note "Examples"
+            ```py
+            with open("permissions.bin", "rb") as fh:
+                with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    pset = PermissionSet.loads(data)
+            ```
+
+        **Arguments**
+
+        - data (`bytes`|`buffer`)
+
+        **Keyword Arguments**
+
+        - compiled (`bool=False`): see `PermissionSet`
+        - cache_size (`int=0`): see `PermissionSet`
+
+        **Returns**
+
+        `PermissionSet`
+        """
+        pset = cls(compiled=compiled, cache_size=cache_size)
+        pset._load(data)
+        return pset
+
+    def _load(self, data: bytes | bytearray | memoryview) -> None:
+        """
+        Replaces the permissions and permission index of this set with
+        the ones in the binary form written by `dumps`
+        """
+
+        with memoryview(data) as view:
+            try:
+                (
+                    magic,
+                    version,
+                    string_count,
+                    string_size,
+                    permission_count,
+                    branch_count,
+                    count,
+                ) = _DUMP_HEADER.unpack_from(view, 0)
+            except struct.error:
+                magic = version = None
+            if magic != _DUMP_MAGIC or version != _DUMP_VERSION:
+                raise ValueError("Data is not a serialized PermissionSet")
+
+            try:
+                offset = _DUMP_HEADER.size
+                lengths = struct.unpack_from(f"<{string_count}I", view, offset)
+                offset += 4 * string_count
+                text = str(view[offset : offset + string_size], "utf-8")
+                offset += string_size
+                strings = []
+                position = 0
+                for length in lengths:
+                    strings.append(text[position : position + length])
+                    position += length
+
+                size = _DUMP_PERMISSION.size * permission_count
+                records = view[offset : offset + size]
+                offset += size
+                if len(records) != size:
+                    raise struct.error("permissions truncated")
+
+                permissions = {}
+                aliased = set()
+                for key, namespace, flags, value in _DUMP_PERMISSION.iter_unpack(
+                    records
+                ):
+                    key = strings[key]
+                    permission = Permission(
+                        Namespace(strings[namespace], strip=bool(flags & _DUMP_STRIP)),
+                        value if flags & _DUMP_HAS_VALUE else None,
+                    )
+                    permissions[key] = permission
+                    if str(permission.namespace) != key:
+                        aliased.add(key)
+
+                size = _DUMP_BRANCH.size * branch_count
+                records = view[offset : offset + size]
+                if len(records) != size:
+                    raise struct.error("index truncated")
+
+                # branches are stored depth first, each followed by its
+                # child branches
+
+                index = {}
+                ra_map = {}
+                stack = [(index, ra_map, count)]
+                for key, flags, value, count in _DUMP_BRANCH.iter_unpack(records):
+                    branch, ra_branch, remaining = stack.pop()
+                    if remaining > 1:
+                        stack.append((branch, ra_branch, remaining - 1))
+                    if not flags & _DUMP_HAS_VALUE:
+                        value = None
+                    key = strings[key]
+                    child = branch[key] = {
+                        "__": value,
+                        "__implicit": bool(flags & _DUMP_IMPLICIT),
+                    }
+                    ra_child = ra_branch[key] = {"__": _readable(value)}
+                    if count:
+                        stack.append((child, ra_child, count))
+            except (struct.error, IndexError, UnicodeDecodeError) as exc:
+                raise ValueError("Serialized PermissionSet is corrupted") from exc
+
+        with self._write() as state:
+            state.permissions = permissions
+            state.aliased = aliased
+            state.index = index
+            state.read_access_map = ra_map
+            state.owned = None
+
+    def __getstate__(self) -> dict:
+        # permissions and index are pickled in their binary form,
+        # anything derived from them is rebuilt on demand
+        state = dict(self.__dict__)
+        for name in ("_state", "_pending", "_lock", "_stats") + _INSTRUMENTED:
+            state.pop(name, None)
+        if self.cache is not None:
+            state["cache"] = DecisionCache(self.cache.maxsize)
+        state["_dump"] = self.dumps()
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        state = dict(state)
+        dump = state.pop("_dump", None)
+        if dump is None:
+            # pickled by a previous version, permissions and index were
+            # pickled as they are
+            legacy = [
+                state.pop(name, {})
+                for name in ("permissions", "index", "read_access_map")
+            ]
+        state.setdefault("compiled", False)
+        state.setdefault("cache", None)
+        self.__dict__.update(state)
+        self._state = _IndexState({}, set(), {}, {})
+        self._pending = None
+        self._lock = threading.RLock()
+        self._stats = None
+        if dump is not None:
+            self._load(dump)
+            return
+        with self._write() as current:
+            current.permissions, current.index, current.read_access_map = legacy
+            current.aliased = {
+                key
+                for key, permission in current.permissions.items()
+                if str(permission.namespace) != key
+            }
+
+    def _index_set(
+        self, state: _IndexState, keys: list[str], value: int | None
+    ) -> None:
+        """
+        Sets the permission value for the specified namespace keys in
+        the permission index and read access map of a state without
+        rebuilding either of them (see `_set_branch`)
+        """
+
+        state.index, state.read_access_map = _set_branch(
+            state.index, state.read_access_map, keys, value, state.owned
+        )
+
+    def _index_remove(self, state: _IndexState, keys: list[str]) -> None:
+        """
+        Removes the permission value for the specified namespace keys
+        from the permission index and read access map of a state without
+        rebuilding either of them (see `_remove_branch`)
+        """
+
+        result = _remove_branch(state.index, state.read_access_map, keys, state.owned)
+        if result is None:
+            # index is out of sync with the permissions, this
+            # can only happen if the index was modified directly
+            self._index_rebuild(state)
+        else:
+            state.index, state.read_access_map = result
+
+    def _check(
+        self,
+        keys: list[str],
+        branch: dict,
+        flags: int | None = None,
+        i: int = 0,
+        explicit: bool = False,
+        length: int = 0,
+    ) -> tuple[int, int, bool]:
+        """
+        Walks the permission index for the specified namespace keys
+        following both exact key and wildcard branches
+
+        Each index branch is visited at most once per walk, so the cost
+        of a check is bounded by the number of index branches matched by
+        the namespace (depth * rules touched), regardless of how many
+        wildcards the rules or the namespace contain.
+
+        **Returns**
+
+        `tuple(<int>,<int>,<bool>)`: see `_select_match`
+        """
+
+        implicit = branch.get("__implicit")
+
+        if not length:
+            length = len(keys)
+
+        try:
+            key = keys[i]
+        except IndexError:
+            return flags, i, implicit
+
+        # permission flag for exact key match
+        key_flag = None
+
+        # permissions for exact key are implied (or not)
+        key_implicit = True
+
+        # position of match in the namespace path for
+        # exact key match
+        key_pos = 0
+
+        # permission flag for wildcard match
+        wc_flag = None
+
+        # permissions for wildcard match are implied (or not)
+        wc_implicit = True
+
+        # position of match in the namespace path for
+        # wildcard match
+        wc_pos = 0
+
+        if key in branch:
+
+            # proceed to next branch by matching key name
+
+            if explicit and branch[key].get("__implicit") and i + 1 >= length:
+
+                # explicit match required, but next branch is
+                # implied so we exit
+
+                key_flag, key_pos = None, 0
+            else:
+
+                key_flag, key_pos, key_implicit = self._check(
+                    keys,
+                    branch[key],
+                    flags=branch[key].get("__", flags),
+                    i=i + 1,
+                    explicit=explicit,
+                    length=length,
+                )
+        if key == "*":
+
+            # the namespace key is a wildcard itself, so the exact
+            # key path IS the wildcard path - walking it a second time
+            # would double the work for every wildcard in the namespace
+
+            wc_flag, wc_pos, wc_implicit = key_flag, key_pos, key_implicit
+
+        elif "*" in branch:
+
+            # proceed down wildcard branch
+
+            if explicit and branch["*"].get("__implicit") and i + 1 >= length:
+
+                # explicit match required, but the next branch is
+                # implied so we exit
+
+                wc_flag, wc_pos = None, 0
+            else:
+                wc_flag, wc_pos, wc_implicit = self._check(
+                    keys,
+                    branch["*"],
+                    flags=branch["*"].get("__", flags),
+                    i=i + 1,
+                    explicit=explicit,
+                    length=length,
+                )
+
+        return _select_match(
+            explicit,
+            flags,
+            i,
+            implicit,
+            key_flag,
+            key_pos,
+            key_implicit,
+            wc_flag,
+            wc_pos,
+            wc_implicit,
+        )
+
+    def _check_compiled(
+        self,
+        keys: list[str],
+        node: IndexNode,
+        i: int = 0,
+        explicit: bool = False,
+        length: int = 0,
+    ) -> tuple[int, int, bool]:
+        """
+        Same as `_check` but walks the compiled index
+        """
+
+        if not length:
+            length = len(keys)
+
+        if i >= length:
+            return node.flags, i, node.implicit
+
+        key_flag, key_pos, key_implicit = None, 0, True
+        wc_flag, wc_pos, wc_implicit = None, 0, True
+
+        child = node.children.get(keys[i])
+        if child is not None and not (explicit and child.implicit and i + 1 >= length):
+            key_flag, key_pos, key_implicit = self._check_compiled(
+                keys, child, i + 1, explicit, length
+            )
+
+        wildcard = node.wildcard
+        if wildcard is child:
+            # exact key path is the wildcard path (see `_check`)
+            wc_flag, wc_pos, wc_implicit = key_flag, key_pos, key_implicit
+        elif wildcard is not None and not (
+            explicit and wildcard.implicit and i + 1 >= length
+        ):
+            wc_flag, wc_pos, wc_implicit = self._check_compiled(
+                keys, wildcard, i + 1, explicit, length
+            )
+
+        return _select_match(
+            explicit,
+            node.flags,
+            i,
+            node.implicit,
+            key_flag,
+            key_pos,
+            key_implicit,
+            wc_flag,
+            wc_pos,
+            wc_implicit,
+        )
+
+    def _check_many(
+        self,
+        keys_list: list[list[str]],
+        members: list[int],
+        branch: dict,
+        flags: int | None = None,
+        i: int = 0,
+        explicit: bool = False,
+    ) -> dict[int, tuple[int, int, bool]]:
+        """
+        Same as `_check` but walks the permission index for several
+        namespaces at once
+
+        Namespaces are grouped by their key at each level, so every
+        index branch is looked up and walked once per distinct namespace
+        prefix instead of once per namespace.
+
+        **Arguments**
+
+        - keys_list (`list<list<str>>`): namespace keys of all namespaces
+        - members (`list<int>`): positions in `keys_list` of the namespaces
+          that reached this branch
+
+        **Returns**
+
+        `dict<int,tuple>`: `_check` result for each member
         """
-        **Keyword Arguments**
 
-        - rules (`list<Permission>`|`dict<str,int>`): list of `Permission` objects
-        or `dict` of `namspace(str)`:`permission(int)` pairs
+        implicit = branch.get("__implicit")
+        results = {}
+        groups = {}
+
+        for m in members:
+            keys = keys_list[m]
+            if i >= len(keys):
+                results[m] = (flags, i, implicit)
+            else:
+                groups.setdefault(keys[i], []).append(m)
+
+        if not groups:
+            return results
+
+        def walk(child: dict, members: list[int]) -> dict:
+            if explicit and child.get("__implicit"):
+                # explicit match required, but next branch is implied
+                # so we exit for namespaces that end there
+                members = [m for m in members if i + 1 < len(keys_list[m])]
+            if not members:
+                return {}
+            return self._check_many(
+                keys_list,
+                members,
+                child,
+                flags=child.get("__", flags),
+                i=i + 1,
+                explicit=explicit,
+            )
+
+        wc_results = {}
+        if "*" in branch:
+            wc_results = walk(
+                branch["*"], [m for group in groups.values() for m in group]
+            )
+
+        no_match = (None, 0, True)
+
+        # namespaces below the same branch mostly end up with the same
+        # results from the exact key and wildcard paths, so decisions
+        # are made once per distinct pair of results
+        decisions = {}
+
+        for key, group in groups.items():
+            if key == "*":
+                key_results = wc_results
+            elif key in branch:
+                key_results = walk(branch[key], group)
+            else:
+                key_results = {}
+
+            for m in group:
+                pair = (key_results.get(m, no_match), wc_results.get(m, no_match))
+                try:
+                    results[m] = decisions[pair]
+                except KeyError:
+                    results[m] = decisions[pair] = _select_match(
+                        explicit, flags, i, implicit, *pair[0], *pair[1]
+                    )
+
+        return results
+
+    def _resolve(self, keys: list[str], index: dict, explicit: bool = False) -> int:
         """
+        Returns the permissions level for the specified namespace keys
+        according to the specified permission index
 
-        if rules is None:
-            rules = []
+        **Arguments**
+
+        - keys (`list<str>`): namespace keys
+        - index (`dict`): permission index
 
-        self.permissions = {}
-        self.index = {}
-        self.read_access_map = {}
+        **Keyword Arguments**
 
-        if type(rules) == list:
-            for permission in rules:
-                self.__add__(permission)
-        elif type(rules) == dict:
-            for ns, p in list(rules.items()):
-                self.__add__(Permission(ns, p))
+        - explicit (`bool=False`): require explicitly set permissions to the provided namespace
 
-    @property
-    def namespaces(self) -> list[str]:
+        **Returns**
+
+        `int`: permission mask
         """
-        `list` of all namespaces registered in this permission set
+
+        p, pos, implicit = self._check(keys, index, explicit=explicit)
+        if not p or (explicit and implicit) or (explicit and pos != len(keys)):
+            p = 0
+        return p
+
+    def get_permissions(
+        self, namespace: Namespace | str, explicit: bool = False
+    ) -> int:
         """
-        return list(self.permissions.keys())
+        Returns the permissions level for the specified namespace
 
-    def __iter__(self):
-        yield from list(self.permissions.values())
+        **Arguments**
 
-    def __contains__(self, item: str) -> bool:
-        return item in self.permissions
+        - namespace (`str`): permissioning namespace
 
-    def __radd__(self, other):
-        self.__add__(other)
+        **Keyword Arguments**
 
-    def __add__(self, other: Permission) -> None:
-        if isinstance(other, Permission):
-            self.permissions[str(other.namespace)] = other
-        self.update_index()
+        - explicit (`bool=False`): require explicitly set permissions to the provided namespace
 
-    def __setitem__(
-        self, key: str, other: Permission | int, reindex: bool = True
-    ) -> None:
-        if isinstance(other, Permission):
-            self.permissions[key] = other
-        elif isinstance(other, int):
-            self.permissions[key] = Permission(key, other)
-        else:
-            raise TypeError(
-                "Value needs to be a Permission instance or a permission flag"
-            )
-        if reindex:
-            self.update_index()
+        **Returns**
 
-    def __delitem__(self, namespace: str) -> None:
-        if namespace in self.permissions:
-            del self.permissions[namespace]
+        `int`: permission mask
+        """
+
+        # the state is read once so the result and the generation it
+        # is cached for always match
+        state = self._state
+
+        if not isinstance(namespace, _NamespaceBase):
+            namespace = Namespace.of(namespace)
+        keys = namespace.keys
+
+        # keyed by the keys that are checked, namespaces with the same
+        # string value can differ in them (see `Namespace` strip)
+        cache = self.cache
+        if cache is not None:
+            generation = state.generation
+            cache_key = (tuple(keys), explicit)
+            p = cache.get(cache_key, generation)
+            if p is not None:
+                return p
+
+        if self.compiled:
+            p, pos, implicit = self._check_compiled(
+                keys, state.compiled(), explicit=explicit
+            )
+            if not p or (explicit and implicit) or (explicit and pos != len(keys)):
+                p = 0
         else:
-            raise KeyError("No permission registered under namespace '%s'" % namespace)
-        self.update_index()
+            p = self._resolve(keys, state.index, explicit=explicit)
+        if cache is not None:
+            cache.set(cache_key, p, generation)
+        return p
 
-    def update(self, permissions: dict, override: bool = True) -> None:
+    def get_permissions_many(
+        self, namespaces: list[Namespace | str], explicit: bool = False
+    ) -> list[int]:
         """
-        Update the permissionset with a dict of namespace<str>:permission<Permission|int|long>
-        pairs
+        Returns the permissions level for each of the specified namespaces
 
-        ??? note "Examples"
-            ```py
-            pset.update(
-              {
-                "a" : const.PERM_READ,
-                "b" : Permission("b", const.PERM_RW)
-              }
+        Namespaces sharing a prefix share the index walk for that
+        prefix, so this is considerably faster than calling
+        `get_permissions` for each namespace when checking many
+        namespaces below the same parent.
+
+        **Arguments**
+
+        - namespaces (`list<str>`): permissioning namespaces
+
+        **Keyword Arguments**
+
+        - explicit (`bool=False`): require explicitly set permissions to the provided namespaces
+
+        **Returns**
+
+        `list<int>`: permission mask for each namespace, in the order
+        the namespaces were passed
+        """
+
+        positions = {}
+        keys_list = []
+        order = []
+        for namespace in namespaces:
+            if not isinstance(namespace, _NamespaceBase):
+                namespace = Namespace.of(namespace)
+            keys = tuple(namespace.keys)
+            if keys not in positions:
+                positions[keys] = len(keys_list)
+                keys_list.append(keys)
+            order.append(positions[keys])
+
+        results = self._check_many(
+            keys_list, list(range(len(keys_list))), self.index, explicit=explicit
+        )
+
+        permissions = []
+        for m, keys in enumerate(keys_list):
+            p, pos, implicit = results[m]
+            if not p or (explicit and implicit) or (explicit and pos != len(keys)):
+                p = 0
+            permissions.append(p)
+
+        return [permissions[m] for m in order]
+
+    def expandable(self, namespace: Namespace | str) -> bool:
+        """
+        Returns whether or not the submitted namespace is expandable.
+
+        An expandable namespace is any namespace that contains "?"
+        keys.
+
+        **Arguments**
+
+        - namespace (`str`): permissioning namespace
+
+        **Returns**
+
+        - `bool`
+        """
+
+        if not isinstance(namespace, _NamespaceBase):
+            namespace = Namespace.of(namespace)
+        return "?" in namespace.keys
+
+    def expand(
+        self,
+        namespace: Namespace | str,
+        explicit: bool = False,
+        index: dict | None = None,
+        path: list[str] | None = None,
+        length: int = 0,
+        exact: bool = False,
+    ) -> list[Namespace]:
+
+        """
+        Expands "?" parts of a namespace into a list of namespaces
+
+        **Arguments**
+
+        - namespace (`str`): permissioning namespace
+
+        **Returns**
+
+        - `list`: list of namespaces
+        """
+
+        return list(
+            self.iter_expand(
+                namespace,
+                explicit=explicit,
+                index=index,
+                path=path,
+                length=length,
+                exact=exact,
             )
-            ```
+        )
+
+    def iter_expand(
+        self,
+        namespace: Namespace | str,
+        explicit: bool = False,
+        index: dict | None = None,
+        path: list[str] | None = None,
+        length: int = 0,
+        exact: bool = False,
+    ) -> Iterator[Namespace]:
+
+        """
+        Same as `expand`, but yields the expanded namespaces one at
+        a time while walking the permission index
 
         **Arguments**
 
-        - permissions (`dict`): dict mapping namespaces (`str`) to permission (`Permission` or `int`)
-        - override (`bool`=True): if True will override existing namespaces if they exist
+        - namespace (`str`): permissioning namespace
+
+        **Returns**
+
+        - `generator`: yields `Namespace` objects, each namespace is
+        yielded only once
         """
-        for k, v in list(permissions.items()):
-            if not override and k in self.permissions:
+
+        for _namespace in self._expand(namespace, explicit, index, path, length, exact):
+            yield Namespace(_namespace.value)
+
+    def _expand(
+        self,
+        namespace: Namespace | str,
+        explicit: bool = False,
+        index: dict | None = None,
+        path: list[str] | None = None,
+        length: int = 0,
+        exact: bool = False,
+    ) -> Iterator[FrozenNamespace]:
+        """
+        Same as `iter_expand`, but yields interned namespaces, see
+        `Namespace.of`
+        """
+
+        if not isinstance(namespace, _NamespaceBase):
+            namespace = Namespace.of(namespace)
+        keys = tuple(namespace.keys)
+
+        if not index:
+            index = self.index
+
+        if not path:
+            path = []
+
+        if not length:
+            length = len(keys)
+
+        seen = set()
+        for _namespace in self._iter_expand(
+            keys, index, list(path), length, explicit, exact
+        ):
+            if _namespace not in seen:
+                seen.add(_namespace)
+                yield _namespace
+
+    def _iter_expand(
+        self,
+        keys: tuple[str],
+        index: dict,
+        path: list[str],
+        length: int,
+        explicit: bool,
+        exact: bool,
+    ) -> Iterator[Namespace]:
+
+        token = keys[0]
+
+        # remaining keys, past the end of the namespace only the
+        # wildcard branches are followed
+        next_keys = keys[1:] or ("*",)
+
+        for k in list(index.keys()):
+            if k[0] == "_":
                 continue
-            self.__setitem__(k, v, reindex=False)
-        self.update_index()
+            if token == k or token == "?" or k == "*":
+                if k == "*" and token != "?":
+                    _path = path + [token]
+                else:
+                    _path = path + [k]
+                if (len(_path) == length or not exact) and (
+                    index[k]["__"] or not explicit
+                ):
+                    _namespace = Namespace.of(_path)
+                    if _namespace.value:
+                        yield _namespace
 
-    def update_index(self) -> dict:
+                yield from self._iter_expand(
+                    next_keys, index[k], _path, length, explicit, exact
+                )
+
+    def check(self, namespace: str, level: int, explicit: bool = False) -> bool:
         """
-        Regenerates the permission index for this set
+        Checks if the permset has permission to the specified namespace
+        at the specified level
+
+        **Arguments**
+
+        - namespace (`str`): permissioning namespace
+        - level (`int`): permission flag, `PERM_READ` for example
+
+        **Keyword Arguments**
+
+        - explicit (`bool=False`): require explicitly set permissions to the provided namespace
+
+        **Returns**
+
+        `bool`: `True` if permissioned `False` if not
 
-        Called everytime a rule is added / removed / modified in
-        the set
         """
 
-        # update index
+        if self.expandable(namespace):
+            # expanded namespaces are checked as they are found, stopping
+            # at the first one that is permissioned
+            for _namespace in self._expand(namespace):
+                if self.get_permissions(_namespace, explicit=explicit) & level != 0:
+                    return True
+            return False
 
-        idx = {}
-        for _, p in sorted(list(self.permissions.items()), key=lambda x: str(x[0])):
-            branch = idx
-            parent_p = None
-            for k in p.namespace.keys:
+        return (self.get_permissions(namespace, explicit=explicit) & level) != 0
+
+    def check_many(
+        self, namespaces: list[Namespace | str], level: int, explicit: bool = False
+    ) -> list[bool]:
+        """
+        Checks if the permset has permission to each of the specified
+        namespaces at the specified level
+
+        See `get_permissions_many`
+
+        **Arguments**
+
+        - namespaces (`list<str>`): permissioning namespaces
+        - level (`int`): permission flag, `PERM_READ` for example
+
+        **Keyword Arguments**
+
+        - explicit (`bool=False`): require explicitly set permissions to the provided namespaces
+
+        **Returns**
+
+        `list<bool>`: result for each namespace, in the order the
+        namespaces were passed
+        """
+
+        namespaces = [
+            ns if isinstance(ns, _NamespaceBase) else Namespace.of(ns)
+            for ns in namespaces
+        ]
+        results = [None] * len(namespaces)
+        direct = []
+
+        for n, namespace in enumerate(namespaces):
+            if "?" in namespace.keys:
+                results[n] = self.check(namespace, level, explicit=explicit)
+            else:
+                direct.append(n)
+
+        permissions = self.get_permissions_many(
+            [namespaces[n] for n in direct], explicit=explicit
+        )
+        for n, p in zip(direct, permissions):
+            results[n] = (p & level) != 0
+
+        return results
+
+    def apply(
+        self,
+        data: dict,
+        path: Any | None = None,
+        applicator: Applicator | None = None,
+        share: bool = False,
+        level: int = const.PERM_READ,
+    ) -> dict:
+        """
+        Apply permissions in this set to the provided data, effectively
+        removing all keys from it are not permissioned to be viewed
 
-                if k not in branch:
-                    branch[k] = {"__": parent_p}
-                    branch[k].update(__implicit=True)
+        **Arguments**
 
-                branch = branch[k]
-                parent_p = branch["__"]
-            branch["__"] = p.value
-            branch["__implicit"] = False
+        - data (`dict`)
 
-        self.index = idx
+        **Keyword Arguments**
 
-        # update read access map
+        - applicator (`Applicator=None`): allows you to specify the
+        applicator instance to use. If none is specified an instance
+        of `Applicator` will be used.
+        - share (`bool=False`): share readable parts of the data with
+        the result instead of copying them, see `Applicator.apply`
+        - level (`int=PERM_READ`): keep only the data that has any of
+        these permission flags, `PERM_UPDATE` for example
 
-        ramap = {}
+        **Returns**
 
-        def update_ramap(branch_idx: dict) -> dict[str, bool]:
-            r = {"__": False}
-            for k, v in list(branch_idx.items()):
-                if k != "__" and k != "__implicit":
-                    r[k] = update_ramap(v)
+        `dict`: cleaned data
+        """
 
-            if (
-                branch_idx["__"] is not None
-                and (branch_idx["__"] & const.PERM_READ) != 0
-            ):
-                r["__"] = True
-            return r
+        if applicator:
+            applicator.pset = self
+        else:
+            applicator = Applicator(self)
 
-        for k, v in list(idx.items()):
-            ramap[k] = update_ramap(v)
+        kwargs = {}
+        if share:
+            kwargs.update(share=True)
+        if level != const.PERM_READ:
+            kwargs.update(level=level)
+        return applicator.apply(data, path=path, **kwargs)
 
-        self.read_access_map = ramap
 
-        return self.index
+class FrozenPermissionSet(PermissionSet):
+    """
+    Immutable view of a `PermissionSet` as it was at one point in time,
+    returned by `PermissionSet.snapshot`
 
-    def _check(
-        self,
-        keys: list[str],
-        branch: dict,
-        flags: int | None = None,
-        i: int = 0,
-        explicit: bool = False,
-        length: int = 0,
-    ) -> tuple[int, int, bool]:
+    Supports everything a `PermissionSet` does except changing it.
+    """
 
-        implicit = branch.get("__implicit")
+    @classmethod
+    def _of(cls, state: _IndexState, compiled: bool = False) -> FrozenPermissionSet:
+        pset = cls.__new__(cls)
+        pset.compiled = compiled
+        pset.cache = None
+        pset._state = state
+        pset._pending = None
+        pset._lock = None
+        pset._stats = None
+        return pset
+
+    def _write(self, copy: bool = False) -> None:
+        raise TypeError("FrozenPermissionSet is immutable")
+
+    def __setstate__(self, state: dict) -> None:
+        state = dict(state)
+        dump = state.pop("_dump")
+        pset = PermissionSet.loads(dump)
+        self.__dict__.update(state)
+        self._state = pset._state
+        self._state.shared = True
+        self._pending = None
+        self._lock = None
+        self._stats = None
+
+    def snapshot(self) -> FrozenPermissionSet:
+        return self
+
+
+class OverlayPermissionSet(PermissionSet):
+    """
+    Permission set layering rules of its own over one or more base
+    permission sets, a role's permissions with per-user overrides for
+    example
+
+    Checks resolve against the combined rules as if they were all
+    in one `PermissionSet`, with rules of later bases replacing rules
+    of earlier ones under the same namespace and the set's own rules
+    replacing both. The index of the first base is shared rather than
+    copied, only the branches the other rules touch are copied, so
+    building an overlay and the memory it takes up scale with the
+    size of the overrides instead of the bases.
+
+    Bases are snapshotted (see `PermissionSet.snapshot`) when the
+    overlay is created, changing them afterwards does not change the
+    overlay.
 
-        if not length:
-            length = len(keys)
+    # Instanced Attributes
 
-        # debug = getattr(self, "debug", False)
+    - bases (`list<FrozenPermissionSet>`)
 
-        try:
-            key = keys[i]
-        except IndexError:
-            return flags, i, implicit
+    # Properties
 
-        # permission flag for exact key match
-        key_flag = None
+    - overrides (`dict`): the set's own permissions, `permissions`
+      holds the combined ones
+    """
 
-        # permissions for exact key are implied (or not)
-        key_implicit = True
+    def __init__(
+        self,
+        bases: PermissionSet | list[PermissionSet],
+        rules: dict[str, int] | list[Permission] | None = None,
+        compiled: bool = False,
+        cache_size: int = 0,
+    ) -> None:
+        """
+        **Arguments**
 
-        # position of match in the namespace path for
-        # exact key match
-        key_pos = 0
+        - bases (`PermissionSet`|`list<PermissionSet>`): base permission
+        set(s), in order of increasing precedence
 
-        # permission flag for wildcard match
-        wc_flag = None
+        **Keyword Arguments**
 
-        # permissions for wildcard match are implied (or not)
-        wc_implicit = True
+        - rules (`list<Permission>`|`dict<str,int>`): override rules,
+        see `PermissionSet`
+        - compiled (`bool=False`): see `PermissionSet`
+        - cache_size (`int=0`): see `PermissionSet`
+        """
 
-        # position of match in the namespace path for
-        # wildcard match
-        wc_pos = 0
+        if isinstance(bases, PermissionSet):
+            bases = [bases]
+        self.bases = [base.snapshot() for base in bases]
+        if not self.bases:
+            raise ValueError("At least one base permission set is required")
 
-        if key in branch:
+        super().__init__(compiled=compiled, cache_size=cache_size)
+        self._overlay()
 
-            # proceed to next branch by matching key name
+        with self._write():
+            if type(rules) == list:
+                for permission in rules:
+                    self.__add__(permission)
+            elif type(rules) == dict:
+                for ns, p in list(rules.items()):
+                    self.__add__(Permission(ns, p))
 
-            if explicit and branch[key].get("__implicit") and i + 1 >= length:
+    def _overlay(self) -> None:
+        """
+        Sets up the combined state of the bases
+        """
 
-                # explicit match required, but next branch is
-                # implied so we exit
+        first = self.bases[0]._state
+        permissions = ChainMap({}, *[base.permissions for base in reversed(self.bases)])
+        aliased = set()
+        for base in self.bases:
+            for key in base._state.aliased:
+                if str(permissions[key].namespace) != key:
+                    aliased.add(key)
+
+        state = _IndexState(permissions, aliased, first.index, first.read_access_map)
+        state.owned = set()
+        state.unindexed = any(base._state.unindexed for base in self.bases)
+        self._state = state
+
+        if len(self.bases) == 1 and not state.unindexed:
+            return
+
+        with self._write() as state:
+            if state.aliased or state.unindexed:
+                self._index_rebuild(state)
+                return
+            for base in self.bases[1:]:
+                for permission in base.permissions.values():
+                    self._index_set(state, permission.namespace.keys, permission.value)
 
-                key_flag, key_pos = None, 0
-            else:
+    @property
+    def overrides(self) -> dict:
+        return self._state.permissions.maps[0]
 
-                key_flag, key_pos, key_implicit = self._check(
-                    keys,
-                    branch[key],
-                    flags=branch[key].get("__", flags),
-                    i=i + 1,
-                    explicit=explicit,
-                    length=length,
+    def __delitem__(self, namespace: str) -> None:
+        with self._write() as state:
+            if (
+                namespace not in state.permissions.maps[0]
+                and namespace in state.permissions
+            ):
+                raise KeyError(
+                    "Permission under namespace '%s' belongs to a base permission set"
+                    % namespace
                 )
-        if "*" in branch:
 
-            # proceed down wildcard branch
+            super().__delitem__(namespace)
 
-            if explicit and branch["*"].get("__implicit") and i + 1 >= length:
+            # a base permission under the same namespace applies again
+            permission = state.permissions.get(namespace)
+            if permission is None:
+                return
+            if str(permission.namespace) != namespace:
+                state.aliased.add(namespace)
+            if state.aliased:
+                self._index_rebuild(state)
+            else:
+                self._index_set(state, permission.namespace.keys, permission.value)
+
+    def __getstate__(self) -> dict:
+        state = dict(self.__dict__)
+        for name in ("_state", "_pending", "_lock", "_stats") + _INSTRUMENTED:
+            state.pop(name, None)
+        if self.cache is not None:
+            state["cache"] = DecisionCache(self.cache.maxsize)
+        state["_overrides"] = list(self.overrides.items())
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        state = dict(state)
+        overrides = state.pop("_overrides")
+        self.__dict__.update(state)
+        self._pending = None
+        self._lock = threading.RLock()
+        self._stats = None
+        self._overlay()
+        with self._write():
+            for key, permission in overrides:
+                self.__setitem__(key, permission)
+
+
+class NamespaceTemplate:
+    """
+    Namespace with variable keys checked against a permission set,
+    returned by `PermissionSet.compile_template`
+
+    The template is split into keys once and the permission index is
+    walked for the fixed keys on first use, each check only walks the
+    index branches of the variable keys, instead of formatting a
+    namespace string, parsing it into keys and walking the whole index
+    path again. The walk is redone once the permission set changes.
+    Namespaces are resolved the same as by the string form, including
+    stripping of trailing wildcards, but without going through the
+    `get_permissions` result cache.
 
-                # explicit match required, but the next branch is
-                # implied so we exit
+    # Instanced Attributes
 
-                wc_flag, wc_pos = None, 0
-            else:
-                wc_flag, wc_pos, wc_implicit = self._check(
-                    keys,
-                    branch["*"],
-                    flags=branch["*"].get("__", flags),
-                    i=i + 1,
-                    explicit=explicit,
-                    length=length,
-                )
+    - pset (`PermissionSet`)
+    - template (`str`)
+    - explicit (`bool`)
+    - keys (`list<str>`): namespace keys, `None` for variable keys
+    """
 
-        # if debug:
-        #   print("")
-        #   print("KEYS (inner)", keys[:i], "pos", i, "flags", flags, "length", l, "expl", explicit, "impl", implicit)
-        #   print("key", key, "flag", key_flag, "implicit", key_implicit, "pos", key_pos, "wc flag", wc_flag, "wc implicit", wc_implicit, "wc pos",  wc_pos)
+    def __init__(self, pset: PermissionSet, template: str, explicit: bool = False):
+        """
+        **Arguments**
 
-        # explicit namespace match required but not found
+        - pset (`PermissionSet`)
+        - template (`str`): namespace with a `{}` (or `{name}`) placeholder
+          for each variable key
 
-        if explicit and key_pos == 0 and wc_pos == 0:
-            return None, i, implicit
+        **Keyword Arguments**
 
-        # RETURN wildcard path permission PASS-1
-        # wildcard path produced a permission flag
+        - explicit (`bool=False`): require explicitly set permissions
+        """
 
-        if wc_flag is not None and (not explicit or not wc_implicit):
+        self.pset = pset
+        self.template = template
+        self.explicit = explicit
+        self.keys = []
+        self._variables = []
+        for i, key in enumerate(template.split(".")):
+            if "{" not in key and "}" not in key:
+                self.keys.append(key)
+                continue
+            if key[0] != "{" or key[-1] != "}" or key.count("{") != 1:
+                raise ValueError(
+                    f"Invalid namespace template '{template}': placeholders need "
+                    "to be whole namespace keys"
+                )
+            self.keys.append(None)
+            self._variables.append(i)
 
-            # RETURN wildcard path permission PASS-1-CHECK-1
-            #
-            # we check if wildcard path length is deeper
-            # than exact match path length.
+        # permission state and walk the fixed keys were resolved for
+        self._compiled = (None, None)
 
-            if key_pos < wc_pos:
+    def __repr__(self) -> str:
+        return f"<NamespaceTemplate {self.template}>"
 
-                # 1. wildcard permission is not implied or both wildcard
-                #    and exact permission are implied
-                #
-                # 2. current branch permission is implied or an explicit
-                #    path is required
+    def _keys(self, values: tuple) -> tuple[list[str], bool]:
+        """
+        Returns the namespace keys for the values of the variable keys
+        and whether they were normalized, in which case they no longer
+        line up with the template keys
+        """
 
-                if (not wc_implicit or key_implicit) and (implicit or explicit):
-                    return wc_flag, wc_pos, wc_implicit
+        if len(values) != len(self._variables):
+            raise ValueError(
+                f"Namespace template '{self.template}' takes "
+                f"{len(self._variables)} values, {len(values)} given"
+            )
 
-            # RETURN wildcard path permission PASS-1-CHECK-2
-            #
-            # 1. exact key path has NOT produced a permission
-            #
-            # 2. current branch permission is implied or an explicit
-            #    path is required
+        keys = list(self.keys)
+        dotted = False
+        for i, value in zip(self._variables, values):
+            value = str(value)
+            if "." in value:
+                dotted = True
+            keys[i] = value
+
+        # the string form is normalized if a value spans several keys or
+        # it ends with a wildcard (see `Namespace`)
+        if dotted or keys[-1][-1:] in ("", "*"):
+            return Namespace.of(".".join(keys)).keys, True
+        return keys, False
+
+    def _plan(self, branch: dict, flags: int | None, i: int):
+        """
+        Walks the permission index from `branch` for the template keys
+        from position `i` on, the same as `PermissionSet._check`
 
-            if key_flag is None and (implicit or explicit):
-                return wc_flag, wc_pos, wc_implicit
+        Fixed keys are walked right away. Returns the result of the walk
+        if it does not depend on the variable keys, otherwise a function
+        returning it for the namespace keys.
+        """
 
-        # RETURN exact path permission PASS-1
-        # exact key path produced a permission flag
+        implicit = branch.get("__implicit")
+        length = len(self.keys)
+        if i >= length:
+            return flags, i, implicit
 
-        if key_flag is not None and (not explicit or not key_implicit):
+        explicit = self.explicit
 
-            # RETURN exact key path permission PASS-1-CHECK-1
-            #
-            # if the exact path permission is not implied or the
-            # current permission is also implied
+        def descend(key):
+            child = branch.get(key)
+            if not isinstance(child, dict) or (
+                explicit and child.get("__implicit") and i + 1 >= length
+            ):
+                return _NO_MATCH
+            return self._plan(child, child.get("__", flags), i + 1)
+
+        def select(key_plan, wc_plan):
+            if type(key_plan) is tuple and type(wc_plan) is tuple:
+                return _select_match(explicit, flags, i, implicit, *key_plan, *wc_plan)
+
+            def walk(keys):
+                key_result = key_plan if type(key_plan) is tuple else key_plan(keys)
+                wc_result = wc_plan if type(wc_plan) is tuple else wc_plan(keys)
+                return _select_match(
+                    explicit, flags, i, implicit, *key_result, *wc_result
+                )
 
-            if not key_implicit or implicit:
-                return key_flag, key_pos, key_implicit
+            return walk
 
-            # RETURN exact key path permission PASS-1-CHECK-2
-            #
-            # if there are no flags on the current branch (first match)
-            if flags is None:
-                return key_flag, key_pos, key_implicit
+        key = self.keys[i]
+        wc_plan = descend("*")
+        if key == "*":
+            # exact key path is the wildcard path (see `_check`)
+            return select(wc_plan, wc_plan)
+        if key is not None:
+            return select(descend(key), wc_plan)
 
-        # RETURN wildcard path permission PASS-2
-        # wildcard produced a permission flag, lets check against
-        # current branch
+        # variable key, the branches of the values are walked the first
+        # time they are checked
 
-        if wc_flag is not None and (not explicit or not wc_implicit):
+        plans = {"*": select(wc_plan, wc_plan)}
+        missing = select(_NO_MATCH, wc_plan)
 
-            # RETURN wildcard path permission PASS-2-CHECK-1
-            #
-            # if the wildcard path permission is not implied or the
-            # current permission is also implied
+        def walk(keys):
+            key = keys[i]
+            plan = plans.get(key)
+            if plan is None:
+                if key in branch:
+                    plan = plans[key] = select(descend(key), wc_plan)
+                else:
+                    plan = missing
+            return plan if type(plan) is tuple else plan(keys)
 
-            if not wc_implicit or implicit:
-                return wc_flag, wc_pos, wc_implicit
+        return walk
 
-            # RETURN wildcard path permission PASS-1-CHECK-2
-            #
-            # if there are no flags on the current branch (first match)
+    def _get(self, keys: list[str], normalized: bool = False) -> int:
+        """
+        Returns the permissions for the namespace keys
+        """
 
-            if flags is None:
-                return wc_flag, wc_pos, wc_implicit
+        state = self.pset._state
+        if normalized:
+            return self.pset._resolve(keys, state.index, explicit=self.explicit)
 
-        # following neither wildard nor exact match produced
-        # a permission flag, return current branch permissions
+        plan_state, plan = self._compiled
+        if plan_state is not state:
+            plan = self._plan(state.index, None, 0)
+            self._compiled = (state, plan)
 
-        return flags, i, implicit
+        p, pos, implicit = plan if type(plan) is tuple else plan(keys)
+        if not p or (self.explicit and (implicit or pos != len(keys))):
+            p = 0
+        return p
 
-    def get_permissions(
-        self, namespace: Namespace | str, explicit: bool = False
-    ) -> int:
+    def __call__(self, values: tuple) -> int:
         """
-        Returns the permissions level for the specified namespace
+        Returns the permissions for the namespace, see
+        `PermissionSet.get_permissions`
 
         **Arguments**
 
-        - namespace (`str`): permissioning namespace
-
-        **Keyword Arguments**
-
-        - explicit (`bool=False`): require explicitly set permissions to the provided namespace
+        - values (`tuple`): values of the variable keys, in order
 
         **Returns**
 
         `int`: permission mask
         """
 
-        if not isinstance(namespace, Namespace):
-            namespace = Namespace(namespace)
-        keys = namespace.keys
-
-        p, pos, implicit = self._check(keys, self.index, explicit=explicit)
-        if not p or (explicit and implicit) or (explicit and pos != len(keys)):
-            p = 0
-        return p
+        return self._get(*self._keys(values))
 
-    def expandable(self, namespace: Namespace | str) -> bool:
+    def check(self, values: tuple, level: int) -> bool:
         """
-        Returns whether or not the submitted namespace is expandable.
-
-        An expandable namespace is any namespace that contains "?"
-        keys.
+        Checks the permissions for the namespace, see `PermissionSet.check`
 
         **Arguments**
 
-        - namespace (`str`): permissioning namespace
+        - values (`tuple`): values of the variable keys, in order
+        - level (`int`): permission flag, `PERM_READ` for example
 
         **Returns**
 
-        - `bool`
+        `bool`
         """
 
-        if not isinstance(namespace, Namespace):
-            namespace = Namespace(namespace)
-        return "?" in namespace.keys
-
-    def expand(
-        self,
-        namespace: Namespace | str,
-        explicit: bool = False,
-        index: dict | None = None,
-        path: list[str] | None = None,
-        length: int = 0,
-        exact: bool = False,
-    ) -> list[Namespace]:
+        keys, normalized = self._keys(values)
+        if "?" in keys:
+            return self.pset.check(Namespace.of(keys), level, explicit=self.explicit)
+        return (self._get(keys, normalized) & level) != 0
 
+    def many(self, values: Iterable[tuple]) -> list[int]:
         """
-        Expands "?" parts of a namespace into a list of namespaces
+        Returns the permissions for the namespaces of several sets of
+        values, see `PermissionSet.get_permissions_many`
 
         **Arguments**
 
-        - namespace (`str`): permissioning namespace
+        - values (`list<tuple>`): values of the variable keys for each
+          namespace
 
         **Returns**
 
-        - `list`: list of namespaces
+        `list<int>`: permission mask for each set of values, in order
         """
 
-        if not isinstance(namespace, Namespace):
-            namespace = Namespace(namespace)
-        keys = namespace.keys
+        permissions = {}
+        result = []
+        for item in values:
+            item = tuple(item)
+            if item not in permissions:
+                permissions[item] = self._get(*self._keys(item))
+            result.append(permissions[item])
+        return result
 
-        if not index:
-            index = self.index
 
-        if not path:
-            path = []
+class _Handlers(dict):
+    """
+    Handlers registered with an `Applicator` by namespace
 
-        if not length:
-            length = len(keys)
+    Counts changes made to it in `version`, so the applicator can tell
+    when to rebuild its handler index.
+    """
 
-        token = keys[0]
-        result = []
+    __slots__ = ("version",)
 
-        for k in list(index.keys()):
-            if k[0] == "_":
-                continue
-            if token == k or token == "?" or k == "*":
-                if k == "*" and token != "?":
-                    _path = path + [token]
-                else:
-                    _path = path + [k]
-                if (len(_path) == length or not exact) and (
-                    index[k]["__"] or not explicit
-                ):
-                    _namespace = Namespace(_path)
-                    if _namespace.value:
-                        result.append(_namespace)
-
-                result += [
-                    ns
-                    for ns in self.expand(
-                        keys[1:],
-                        index=index[k],
-                        path=_path,
-                        length=length,
-                        explicit=explicit,
-                        exact=exact,
-                    )
-                ]
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.version = 0
 
-        return list(set(result))
+    def __setitem__(self, key: str, value: dict) -> None:
+        super().__setitem__(key, value)
+        self.version += 1
 
-    def check(self, namespace: str, level: int, explicit: bool = False) -> bool:
-        """
-        Checks if the permset has permission to the specified namespace
-        at the specified level
+    def __delitem__(self, key: str) -> None:
+        super().__delitem__(key)
+        self.version += 1
 
-        **Arguments**
+    def __ior__(self, other: Any) -> _Handlers:
+        self.update(other)
+        return self
 
-        - namespace (`str`): permissioning namespace
-        - level (`int`): permission flag, `PERM_READ` for example
+    def pop(self, *args: Any) -> Any:
+        self.version += 1
+        return super().pop(*args)
 
-        **Keyword Arguments**
+    def popitem(self) -> tuple[str, dict]:
+        self.version += 1
+        return super().popitem()
 
-        - explicit (`bool=False`): require explicitly set permissions to the provided namespace
+    def setdefault(self, key: str, default: dict | None = None) -> dict:
+        self.version += 1
+        return super().setdefault(key, default)
 
-        **Returns**
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        super().update(*args, **kwargs)
+        self.version += 1
 
-        `bool`: `True` if permissioned `False` if not
+    def clear(self) -> None:
+        super().clear()
+        self.version += 1
+
+
+class Applicator:
+
+    """
+    Handles application of permissions to a dataset contained
+    in a dict
 
+    Any data that is not permissioned to be read will be removed
+    during application of permissions.
+    """
+
+    def __init__(self, pset: PermissionSet) -> None:
+        self.pset = pset
+        self.handlers = {}
+        self._access_maps = {}
+        self._readable_branches = {}
+        self._key_handlers = None
+
+    @property
+    def handlers(self) -> dict:
         """
+        Registered handlers by namespace, see `handler`
 
-        if self.expandable(namespace):
-            for _namespace in self.expand(namespace):
-                if self.get_permissions(_namespace, explicit=explicit) & level != 0:
-                    return True
-            return False
+        Can be changed directly, the handler index is rebuilt for any
+        change made to it.
+        """
+        return self._handlers
 
-        return (self.get_permissions(namespace, explicit=explicit) & level) != 0
+    @handlers.setter
+    def handlers(self, handlers: dict) -> None:
+        self._handlers = _Handlers(handlers)
+        self._handler_index = None
 
-    def apply(
-        self,
-        data: dict,
-        path: Any | None = None,
-        applicator: Applicator | None = None,
-    ) -> dict:
+    @property
+    def handler_index(self) -> dict:
         """
-        Apply permissions in this set to the provided data, effectively
-        removing all keys from it are not permissioned to be viewed
+        Index of the registered handlers by namespace, built the same
+        way as the permission index
+
+        Each branch holds the handler registered for its namespace
+        under the `__` key as a `(position, handler)` tuple, position
+        being the order in which the handler was registered.
+        """
+        handlers = self._handlers
+        cached = self._handler_index
+        if cached is None or cached[0] != handlers.version:
+            index = {}
+            for position, handler in enumerate(handlers.values()):
+                branch = index
+                for k in handler["namespace"].keys:
+                    branch = branch.setdefault(k, {})
+                branch["__"] = (position, handler)
+            cached = (handlers.version, index)
+            self._handler_index = cached
+        return cached[1]
+
+    def read_access_map(self) -> dict:
+        """
+        Returns the read access map to apply, see `access_map`
+
+        **Returns**
+
+        `dict`: read access map
+        """
+        return self.access_map()
+
+    def access_map(self, level: int = const.PERM_READ) -> dict:
+        """
+        Returns the access map to apply, which is the access map of the
+        permission set with deny rules added for every handler that
+        specifies the `explicit` argument
 
-        **Arguments**
+        A deny rule is added for such a handler if the namespace it
+        handles has any of the flags in `level` but has no permissions
+        set for it. Rules are added to a copy-on-write overlay of the
+        permission index, the permission set itself is never changed, so
+        a permission set can be applied by several threads at once.
 
-        - data (`dict`)
+        The overlay is computed once per level and reused until either
+        the permission set or the handlers change.
 
         **Keyword Arguments**
 
-        - applicator (`Applicator=None`): allows you to specify the
-        applicator instance to use. If none is specified an instance
-        of `Applicator` will be used.
+        - level (`int=PERM_READ`): permission flags
 
         **Returns**
 
-        `dict`: cleaned data
+        `dict`: access map
         """
 
-        if applicator:
-            applicator.pset = self
-        else:
-            applicator = Applicator(self)
+        pset = self.pset
+        handler_index = self.handler_index
+        cached = self._access_maps.get(level)
+        if (
+            cached is not None
+            and cached[0] is pset
+            and cached[1] == pset.generation
+            and cached[2] is handler_index
+        ):
+            return cached[3]
+
+        generation = pset.generation
+        ra_map = pset.access_map(level)
+        owned = set()
+        namespaces = None
+        snapshot = None
 
-        return applicator.apply(data, path=path)
+        for ns, handler in list(self.handlers.items()):
+            if not handler.get("explicit"):
+                continue
 
+            if snapshot is None:
+                # the overlay shares branches with the index, which
+                # needs to stay as it is while the overlay is used
+                snapshot = pset.snapshot()
+                generation = snapshot.generation
+                index = snapshot.index
+                ra_map = snapshot.access_map(level)
+
+            namespace = Namespace.of(ns)
+            p = snapshot._resolve(namespace.keys, index)
+            if not p & level:
+                continue
 
-class Applicator:
+            if namespaces is None:
+                namespaces = [Namespace.of(_ns) for _ns in snapshot.namespaces]
 
-    """
-    Handles application of permissions to a dataset contained
-    in a dict
+            exists = False
+            for _namespace in namespaces:
+                if _namespace.match(namespace.keys, partial=False):
+                    exists = True
+                    break
+            if exists:
+                continue
 
-    Any data that is not permissioned to be read will be removed
-    during application of permissions.
-    """
+            namespaces.append(Namespace.of(ns))
+            index, ra_map = _set_branch(
+                index, ra_map, namespace.keys, const.PERM_DENY, owned, level
+            )
 
-    def __init__(self, pset: PermissionSet) -> None:
-        self.pset = pset
-        self.handlers = {}
+        self._access_maps[level] = (pset, generation, handler_index, ra_map)
+        return ra_map
 
     def handler(
         self,
@@ -788,23 +3762,136 @@ class Applicator:
         explicit: bool = False,
         **kwargs: Any,
     ) -> None:
-        if not isinstance(path, Namespace):
+        if not isinstance(path, _NamespaceBase):
             path = Namespace(path, strip=False)
         handler = {"namespace": path, "key": key, "explicit": explicit}
         handler.update(**kwargs)
         self.handlers[str(path)] = handler
 
+    def _match_handlers(self, branches: list[dict], keys: list[str]) -> list[dict]:
+        """
+        Advances a list of handler index branches matched so far
+        by the specified namespace keys
+
+        Wildcards match any key on both sides, same as `Namespace.match`
+
+        **Arguments**
+
+        - branches (`list<dict>`): handler index branches matched so far
+        - keys (`list<str>`): namespace keys to advance by
+
+        **Returns**
+
+        `list<dict>`: handler index branches matched
+        """
+        for key in keys:
+            matched = []
+            for branch in branches:
+                if key == "*":
+                    matched.extend(v for k, v in branch.items() if k != "__")
+                    continue
+                if key in branch:
+                    matched.append(branch[key])
+                if "*" in branch:
+                    matched.append(branch["*"])
+            branches = matched
+            if not branches:
+                break
+        return branches
+
+    def _matched_handler(self, branches: list[dict]) -> dict | None:
+        """
+        Returns the first registered handler out of the handlers
+        held by the specified handler index branches
+        """
+        matched = None
+        for branch in branches:
+            if "__" in branch and (matched is None or branch["__"][0] < matched[0]):
+                matched = branch["__"]
+        if matched is None:
+            return None
+        return matched[1]
+
     def find_handler(self, path):
         handler = None
         if path and self.handlers:
-            namespace = Namespace(path, strip=False)
-            for _handler in list(self.handlers.values()):
-                if namespace.match(_handler.get("namespace").keys, partial=False):
-                    handler = _handler
-                    break
+            namespace = Namespace.of(path, strip=False)
+            handler = self._matched_handler(
+                self._match_handlers([self.handler_index], namespace.keys)
+            )
         return handler
 
-    def apply(self, data: dict, path: list[str] | None = None) -> dict:
+    def readable_branches(self, level: int = const.PERM_READ) -> set[int]:
+        """
+        Returns the ids of the branches of the access map for `level`
+        that are accessible along with everything below them
+
+        Computed once and reused until the access map changes. Unless
+        handlers added deny rules to it (see `access_map`) the access
+        map is the one of the permission set, in which case this is
+        kept with the permission set state and shared by all
+        applicators of it.
+
+        **Keyword Arguments**
+
+        - level (`int=PERM_READ`): permission flags
+
+        **Returns**
+
+        `set<int>`
+        """
+
+        ra_map = self.access_map(level)
+
+        state = self.pset._state
+        if state.access_map(level) is ra_map:
+            return state.readable_branches(level)
+
+        # the access map of the permission set may have been changed
+        # in place, so this is tied to the overlay it was computed for
+        overlay = self._access_maps[level]
+        cached = self._readable_branches.get(level)
+        if cached is not None and cached[0] is overlay:
+            return cached[1]
+
+        branches = _readable_branches(ra_map)
+        self._readable_branches[level] = (overlay, branches)
+        return branches
+
+    def _key_handler_branches(self) -> set[int]:
+        """
+        Returns the ids of the branches of `handler_index` that hold a
+        handler with a `key` function either themselves or below them
+        """
+
+        handler_index = self.handler_index
+        cached = self._key_handlers
+        if cached is not None and cached[0] is handler_index:
+            return cached[1]
+
+        branches = set()
+
+        def walk(branch: dict) -> bool:
+            found = "__" in branch and branch["__"][1].get("key") is not None
+            for k, child in branch.items():
+                if k != "__" and walk(child):
+                    found = True
+            if found:
+                branches.add(id(branch))
+            return found
+
+        walk(handler_index)
+
+        self._key_handlers = (handler_index, branches)
+        return branches
+
+    def apply(
+        self,
+        data: dict,
+        path: list[str] | None = None,
+        share: bool = False,
+        level: int = const.PERM_READ,
+    ) -> dict:
         """
         Apply permissions in this set to the provided data, effectively
         removing all keys from it are not permissioned to be viewed
@@ -813,6 +3900,17 @@ class Applicator:
 
         - data (`dict`)
 
+        **Keyword Arguments**
+
+        - share (`bool=False`): share data with the result instead
+        of copying it where possible. Parts of the data that are readable
+        in full are returned as they are (including any empty containers
+        in them) and containers are only copied if something is removed
+        from them. Both the result and the data should then be treated
+        as read-only.
+        - level (`int=PERM_READ`): keep only the data that has any of
+        these permission flags, `PERM_UPDATE` for example
+
         **Returns**
 
         `dict`: cleaned data
@@ -824,108 +3922,282 @@ class Applicator:
         if not isinstance(data, dict):
             return data
 
-        def _enumerate(value: dict) -> Iterator:
-            if isinstance(value, list):
-                yield from enumerate(value)
-            elif isinstance(value, dict):
-                yield from list(value.items())
+        rv = self._apply(
+            self.access_map(level),
+            data,
+            path=path,
+            handlers=self._path_handlers(path),
+            shared=self._shared(share, level),
+        )
 
-        def _set(container: dict, key: str, value: dict | bool | str) -> None:
-            if isinstance(container, list):
-                container.append(value)
-            else:
-                container[key] = value
+        return rv
+
+    def iter_apply(
+        self,
+        rows: Iterable,
+        path: list[str] | None = None,
+        share: bool = False,
+        level: int = const.PERM_READ,
+    ) -> Iterator:
+        """
+        Apply permissions in this set to the rows of an iterable, yielding
+        each filtered row as it is consumed
 
-        def _apply(
-            ramap: dict,
-            value: dict,
-            status: bool = False,
-            wc: bool = False,
-            path: list[str] = [],
-        ) -> dict[str, bool]:
+        The rows are filtered the same way as the items of a list at
+        `path` in the data passed to `apply`, so
+        `iter_apply(rows, ["a"])` yields the rows of
+        `apply({"a": list(rows)})["a"]` without ever holding more than
+        one row in memory.
 
-            if not isinstance(value, dict) and not isinstance(value, list):
-                if status:
-                    return value
-                else:
-                    return None
+        **Arguments**
+
+        - rows (`iterable`): any iterable, including generators
+
+        **Keyword Arguments**
+
+        - path (`list=None`): location of the rows in the data
+        - share (`bool=False`): see `apply`
+        - level (`int=PERM_READ`): see `apply`
+
+        **Returns**
+
+        generator of filtered rows
+        """
+
+        if path is None:
+            path = []
 
+        # walk the access map down to the rows the same way `_apply`
+        # descends into a child container
+
+        ramap = self.access_map(level)
+        status = False
+        for key in path:
             status = ramap.get("__", status)
+            key = str(key)
+            if key in ramap:
+                ramap = ramap[key]
+            elif "*" in ramap:
+                ramap = ramap["*"]
+            else:
+                # not covered by any rule
+                if status:
+                    yield from rows
+                return
+
+        shared = self._shared(share, level)
+        handlers = self._path_handlers(path)
+        status, key_handler, whole = self._enter(ramap, status, path, handlers, shared)
+
+        if whole:
+            yield from rows
+            return
+
+        for _, _, r in self._filter_items(
+            ramap,
+            enumerate(rows),
+            status,
+            key_handler or list_key_handler,
+            path,
+            handlers,
+            shared,
+        ):
+            if r is not _removed:
+                yield r
+
+    def _shared(
+        self, share: bool, level: int = const.PERM_READ
+    ) -> tuple[set[int], set[int]] | None:
+        """
+        Returns the branches that can be shared during apply, None if
+        not sharing
+        """
+
+        if not share:
+            return None
+        return (self.readable_branches(level), self._key_handler_branches())
+
+    def _path_handlers(self, path: list[str]) -> list[dict]:
+        """
+        Returns the handler index branches matching `path`
+        """
+
+        if not self.handlers:
+            return []
+        return self._match_handlers(
+            [self.handler_index], [k for p in path for k in str(p).split(".")]
+        )
+
+    def _enter(
+        self,
+        ramap: dict,
+        status: bool,
+        path: list[str],
+        handlers: list[dict],
+        shared: tuple[set[int], set[int]] | None,
+    ) -> tuple[bool, Callable | None, bool]:
+        """
+        Prepares application of the read access map branch `ramap` to a
+        container at `path`
+
+        **Returns**
+
+        `tuple`: read status, key handler and whether the container can
+        be returned as it is
+        """
+
+        status = ramap.get("__", status)
 
-            handler = None
-            key_handler = None
-            if path and self.handlers:
-                namespace = Namespace(path)
-                for _handler in list(self.handlers.values()):
-                    if namespace.match(_handler.get("namespace").keys, partial=False):
-                        handler = _handler
-                        key_handler = handler.get("key")
-                        break
-
-            if isinstance(value, list):
-                if not key_handler:
-                    key_handler = list_key_handler
-                rv = []
+        handler = None
+        key_handler = None
+        stripped = False
+        if path and self.handlers:
+            last = str(path[-1])
+            stripped = not last or last[-1] in ".*"
+            if stripped:
+                # trailing wildcards are stripped from the namespace
+                # so match it in full
+                handler = self.find_handler(Namespace.of(path))
             else:
-                rv = {}
+                handler = self._matched_handler(handlers)
+            if handler:
+                key_handler = handler.get("key")
+
+        # readable in full and no keys to rename, containers matched by
+        # the keys of a branch are removed if they end up empty, so only
+        # the ones without keys below them are returned as they are
+        whole = bool(
+            shared
+            and status
+            and id(ramap) in shared[0]
+            and len(ramap) == 1
+            and not stripped
+            and not any(id(branch) in shared[1] for branch in handlers)
+        )
+
+        return status, key_handler, whole
+
+    def _apply(
+        self,
+        ramap: dict,
+        value: dict,
+        status: bool = False,
+        wc: bool = False,
+        path: list[str] = [],
+        handlers: list[dict] = [],
+        shared: tuple[set[int], set[int]] | None = None,
+    ) -> dict[str, bool]:
+
+        # handlers holds the handler index branches matching the
+        # path, walked alongside the read access map
+
+        if not isinstance(value, dict) and not isinstance(value, list):
+            if status:
+                return value
+            else:
+                return None
 
-            for k, v in _enumerate(value):
-                if key_handler:
-                    k = key_handler(v, k)
-                k = str(k)
-                if isinstance(v, dict) or isinstance(v, list):
-                    if k in ramap:
-                        r = _apply(ramap[k], v, status=status, path=path + [k])
-                        if r:
-                            _set(rv, k, r)
-                    elif "*" in ramap:
-                        r = _apply(
-                            ramap["*"], v, status=status, wc=True, path=path + [k]
-                        )
-                        if r:
-                            _set(rv, k, r)
-                    elif status:
-                        _set(rv, k, v)
-                else:
-                    if k in ramap:
-                        if ramap[k].get("__", True):
-                            _set(rv, k, v)
-                    elif "*" in ramap and ramap["*"].get("__", True):
-                        _set(rv, k, v)
-                    elif status:
-                        _set(rv, k, v)
+        status, key_handler, whole = self._enter(ramap, status, path, handlers, shared)
 
-            return rv
+        if whole:
+            return value
 
-        # loop through all the handlers that specify the `explicit` arguments
-        # and temprorarily add deny rules for those to the targeted permissionset
-        tmpns = {}
-        for ns, handler in list(self.handlers.items()):
-            if handler.get("explicit"):
-                p = self.pset.get_permissions(ns)
-                if p & const.PERM_READ:
-                    exists = False
-                    for _ns in self.pset.namespaces:
-                        if Namespace(_ns).match(Namespace(ns).keys, partial=False):
-                            exists = True
-                            break
-                    if exists:
-                        continue
-                    tmpns[ns] = p
-                    self.pset[ns] = const.PERM_DENY
-
-        # apply permissions
-        rv = _apply(self.pset.read_access_map, data, path=path)
-
-        # remove temporarily added deny rules
-        for ns, p in list(tmpns.items()):
-            if p is None:
-                del self.pset[ns]
+        if isinstance(value, list):
+            if not key_handler:
+                key_handler = list_key_handler
+            rv = []
+            items = enumerate(value)
+        else:
+            rv = {}
+            items = list(value.items())
+
+        # whether anything was removed or replaced, keys returned by
+        # a key handler count as replaced
+        changed = bool(key_handler) and isinstance(value, dict)
+
+        for k, v, r in self._filter_items(
+            ramap, items, status, key_handler, path, handlers, shared
+        ):
+            if r is _removed:
+                changed = True
+            elif isinstance(rv, list):
+                rv.append(r)
+                changed = changed or r is not v
             else:
-                self.pset[ns] = p
+                rv[k] = r
+                changed = changed or r is not v
+
+        if shared and not changed and len(rv) == len(value):
+            return value
 
         return rv
 
+    def _filter_items(
+        self,
+        ramap: dict,
+        items: Iterable,
+        status: bool,
+        key_handler: Callable | None,
+        path: list[str],
+        handlers: list[dict],
+        shared: tuple[set[int], set[int]] | None,
+    ) -> Iterator:
+        """
+        Applies the read access map branch `ramap` to the `(key, value)`
+        pairs of a container
+
+        **Returns**
+
+        generator of `(key, value, result)` tuples, `result` is
+        `_removed` for values that are not readable
+        """
+
+        for k, v in items:
+            if key_handler:
+                k = key_handler(v, k)
+            k = str(k)
+            if isinstance(v, dict) or isinstance(v, list):
+                r = None
+                if k in ramap:
+                    r = self._apply(
+                        ramap[k],
+                        v,
+                        status=status,
+                        path=path + [k],
+                        handlers=handlers
+                        and self._match_handlers(handlers, k.split(".")),
+                        shared=shared,
+                    )
+                elif "*" in ramap:
+                    r = self._apply(
+                        ramap["*"],
+                        v,
+                        status=status,
+                        wc=True,
+                        path=path + [k],
+                        handlers=handlers
+                        and self._match_handlers(handlers, k.split(".")),
+                        shared=shared,
+                    )
+                elif status:
+                    # not covered by any rule, kept as is
+                    yield k, v, v
+                    continue
+                # containers left empty are removed, even if they were
+                # returned as they are
+                if r:
+                    yield k, v, r
+                else:
+                    yield k, v, _removed
+            else:
+                if k in ramap:
+                    allowed = ramap[k].get("__", True)
+                elif "*" in ramap and ramap["*"].get("__", True):
+                    allowed = True
+                else:
+                    allowed = status
+                yield k, v, v if allowed else _removed
+
 
 class NamespaceKeyApplicator(Applicator):
 
@@ -943,43 +4215,411 @@ class NamespaceKeyApplicator(Applicator):
 
     denied = object()
 
-    def apply(self, data: list | dict | Any, **kwargs) -> Any:
+    def __init__(self, pset: PermissionSet, cache_size: int = 1024) -> None:
+        """
+        **Arguments**
+
+        - pset (`PermissionSet`)
+
+        **Keyword Arguments**
+
+        - cache_size (`int=1024`): cache the handler and read permission
+        lookups of up to this many namespaces, rows that share a
+        namespace are then only looked up once for as long as neither
+        the permission set nor the handlers change. 0 to disable.
+        """
+        super().__init__(pset)
+        self.decisions = DecisionCache(cache_size) if cache_size else None
+
+    def handler(self, path: str, *args: Any, **kwargs: Any) -> None:
+        super().handler(path, *args, **kwargs)
+        if self.decisions is not None:
+            self.decisions.clear()
+
+    def cache_info(self) -> dict[str, int]:
+        """
+        Returns hit, miss and eviction counters of the namespace lookup
+        cache, every hit is one handler lookup and one permission check
+        saved
+
+        **Returns**
+
+        `dict`: empty if caching is not enabled
+        """
+        if self.decisions is None:
+            return {}
+        return self.decisions.info()
+
+    def _lookup(
+        self, namespace: Any, level: int = const.PERM_READ
+    ) -> tuple[dict | None, bool]:
+        """
+        Returns the handler for a namespace and whether the namespace
+        has any of the flags in `level`
+
+        **Returns**
+
+        `tuple`: handler (`dict` or None) and permission (`bool`)
+        """
+
+        decisions = self.decisions
+        cacheable = decisions is not None and isinstance(namespace, str)
+        if cacheable:
+            generation = (self.pset, self.pset.generation)
+            decision = decisions.get((namespace, level), generation)
+            if decision is not None:
+                return decision
+
+        handler = self.find_handler(namespace)
+        explicit = handler.get("explicit", False) if handler else False
+        readable = not namespace or self.pset.check(namespace, level, explicit=explicit)
+
+        if cacheable:
+            decisions.set((namespace, level), (handler, readable), generation)
+        return handler, readable
+
+    def apply(
+        self, data: list | dict | Any, level: int = const.PERM_READ, **kwargs
+    ) -> Any:
 
         if isinstance(data, list):
-            return self.apply_list(data)
+            return self.apply_list(data, level=level)
         elif isinstance(data, dict):
             namespace = data.get(self.namespace_key)
 
-            explicit = False
-            fn = False
-            handler = self.find_handler(namespace)
-            if handler:
-                explicit = handler.get("explicit", False)
-                fn = handler.get("fn", None)
+            handler, readable = self._lookup(namespace, level)
 
+            fn = handler.get("fn", None) if handler else None
             if fn:
                 fn(namespace, data)
 
-            if namespace and not self.pset.check(namespace, 0x01, explicit=explicit):
+            if not readable:
                 return self.denied
             elif namespace and self.remove_namespace_key:
                 del data[self.namespace_key]
 
-            return self.apply_dict(data)
+            return self.apply_dict(data, level=level)
         return data
 
-    def apply_list(self, data: list, **kwargs) -> list:
-        _data = []
-        for row in data:
-            _row = self.apply(row)
+    def apply_list(self, data: list, level: int = const.PERM_READ, **kwargs) -> list:
+        return list(self.iter_apply(data, level=level))
+
+    def iter_apply(
+        self, rows: Iterable, level: int = const.PERM_READ, **kwargs
+    ) -> Iterator:
+        """
+        Applies permissions to the rows of an iterable, yielding each
+        row that is permissioned to be viewed as it is consumed
+
+        **Arguments**
+
+        - rows (`iterable`): any iterable, including generators
+
+        **Keyword Arguments**
+
+        - level (`int=PERM_READ`): keep only the rows that have any of
+        these permission flags
+
+        **Returns**
+
+        generator of filtered rows
+        """
+
+        for row in rows:
+            _row = self.apply(row, level=level)
             if _row != self.denied:
-                _data.append(_row)
-        return _data
+                yield _row
 
-    def apply_dict(self, data: dict, **kwargs) -> dict:
+    def apply_dict(self, data: dict, level: int = const.PERM_READ, **kwargs) -> dict:
         _data = {}
         for key, item in data.items():
-            _item = self.apply(item)
+            _item = self.apply(item, level=level)
             if _item != self.denied:
                 _data[key] = _item
         return _data
+
+
+def _json_skip(text: str, pos: int) -> int:
+    """
+    Scans past the JSON value starting at `pos`
+
+    Containers are skipped with the C accelerated decoder, which in
+    CPython is faster than scanning them for their end in Python.
+
+    **Returns**
+
+    `int`: position after the value
+    """
+
+    char = text[pos : pos + 1]
+    if char in ("{", "["):
+        return _JSON_DECODER.raw_decode(text, pos)[1]
+    if char == '"':
+        match = _JSON_STRING.match(text, pos)
+    else:
+        match = _JSON_SCALAR.match(text, pos)
+    if not match:
+        raise json.JSONDecodeError("Expecting value", text, pos)
+    return match.end()
+
+
+def _json_dumps(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+class JSONApplicator(Applicator):
+
+    """
+    Applicator that filters raw JSON documents
+
+    The document is scanned alongside the read access map, values that
+    are denied are skipped and values that are readable in full are
+    copied through as they are. Containers are skipped by the C
+    accelerated decoder, discarding what it decodes, which in CPython
+    is faster than scanning them for their end in Python. Values whose
+    keys depend on their contents (list rows and namespaces handled by
+    a `key` handler) are decoded, and so are containers with a wildcard
+    rule below them, as all of their items need filtering. Documents
+    that are mostly made up of such containers, rows of a list with
+    rules for their fields for example, are filtered about as fast as
+    with `json.loads` and `json.dumps`.
+
+    The result is the same as encoding the result of
+    `Applicator.apply(json.loads(data), share=True)`.
+    """
+
+    def apply(
+        self,
+        data: str | bytes,
+        path: list[str] | None = None,
+        share: bool = True,
+        level: int = const.PERM_READ,
+    ) -> str | bytes:
+        """
+        Apply permissions in this set to a JSON document
+
+        **Arguments**
+
+        - data (`str|bytes`): JSON document, bytes are decoded as utf-8
+
+        **Keyword Arguments**
+
+        - path (`list=None`)
+        - share (`bool=True`): readable values are always copied
+        through, the argument is accepted for compatibility
+        - level (`int=PERM_READ`): see `Applicator.apply`
+
+        **Returns**
+
+        `str|bytes`: filtered JSON document, of the same type as `data`
+        """
+
+        if path is None:
+            path = []
+
+        if isinstance(data, (bytes, bytearray)):
+            text = data.decode("utf-8")
+        else:
+            text = data
+
+        pos = _JSON_WS.match(text).end()
+
+        # anything but an object is returned as it is, same as `apply`
+        if text[pos : pos + 1] != "{":
+            return data
+
+        rv, end, _ = self._apply_json(
+            text,
+            pos,
+            self.access_map(level),
+            path=path,
+            handlers=self._path_handlers(path),
+            shared=self._shared(True, level),
+        )
+
+        if _JSON_WS.match(text, end).end() != len(text):
+            raise json.JSONDecodeError("Extra data", text, end)
+
+        if rv is None:
+            rv = "{}"
+
+        if isinstance(data, (bytes, bytearray)):
+            return rv.encode("utf-8")
+        return rv
+
+    def _apply_json(
+        self,
+        text: str,
+        start: int,
+        ramap: dict,
+        status: bool = False,
+        path: list[str] = [],
+        handlers: list[dict] = [],
+        shared: tuple[set[int], set[int]] | None = None,
+    ) -> tuple[str | None, int, bool]:
+        """
+        Applies the read access map branch `ramap` to the JSON object
+        or array starting at `start`, mirrors `Applicator._apply`
+
+        **Returns**
+
+        `tuple`: filtered JSON text (None if removed), position after
+        the container and whether the text was copied through as it is
+        """
+
+        inherited = status
+        status, key_handler, whole = self._enter(ramap, status, path, handlers, shared)
+
+        is_list = text[start] == "["
+        close = "]" if is_list else "}"
+        pos = _JSON_WS.match(text, start + 1).end()
+
+        # containers that end up empty are removed, see `Applicator._apply`
+
+        if not status and all(k == "__" for k in ramap):
+            # nothing in the container is readable
+            return None, _json_skip(text, start), False
+
+        if whole:
+            end = _json_skip(text, start)
+            if text[pos : pos + 1] == close:
+                return None, end, False
+            return text[start:end], end, True
+
+        wildcard = ramap.get("*")
+        if wildcard is not None and any(k != "__" for k in wildcard):
+            # every item is filtered key by key, which decoding and
+            # filtering the container as a whole does a lot faster
+            value, end = _JSON_DECODER.raw_decode(text, start)
+            rv = self._apply(
+                ramap,
+                value,
+                status=inherited,
+                path=path,
+                handlers=handlers,
+                shared=shared,
+            )
+            if not rv:
+                return None, end, False
+            if rv is value:
+                return text[start:end], end, True
+            return _json_dumps(rv), end, False
+
+        if (
+            is_list
+            and not key_handler
+            and (self.handlers or any(k not in ("__", "*") for k in ramap))
+        ):
+            # keys of rows only matter if they can match something
+            key_handler = list_key_handler
+
+        parts = []
+        changed = bool(key_handler) and not is_list
+        idx = 0
+
+        while text[pos : pos + 1] != close:
+            if is_list:
+                k = idx
+            else:
+                match = _JSON_STRING.match(text, pos)
+                if not match:
+                    raise json.JSONDecodeError(
+                        "Expecting property name enclosed in double quotes",
+                        text,
+                        pos,
+                    )
+                raw_key = match.group()
+                if "\\" in raw_key:
+                    k = json.loads(raw_key)
+                else:
+                    k = raw_key[1:-1]
+                pos = _JSON_WS.match(text, match.end()).end()
+                if text[pos : pos + 1] != ":":
+                    raise json.JSONDecodeError("Expecting ':' delimiter", text, pos)
+                pos = _JSON_WS.match(text, pos + 1).end()
+
+            char = text[pos : pos + 1]
+
+            if key_handler and (
+                key_handler is not list_key_handler or char in ("{", "[")
+            ):
+                # the key depends on the value, so it needs decoding
+
+                v, end = _JSON_DECODER.raw_decode(text, pos)
+                for k, v, r in self._filter_items(
+                    ramap, [(k, v)], status, key_handler, path, handlers, shared
+                ):
+                    if r is _removed:
+                        rv = None
+                    elif r is v:
+                        rv = text[pos:end]
+                    else:
+                        rv = _json_dumps(r)
+                        changed = True
+                    if not is_list:
+                        raw_key = _json_dumps(k)
+
+            else:
+                k = str(k)
+                verbatim = True
+                if char in ("{", "["):
+                    if k in ramap:
+                        rv, end, verbatim = self._apply_json(
+                            text,
+                            pos,
+                            ramap[k],
+                            status=status,
+                            path=path + [k],
+                            handlers=handlers
+                            and self._match_handlers(handlers, k.split(".")),
+                            shared=shared,
+                        )
+                    elif "*" in ramap:
+                        rv, end, verbatim = self._apply_json(
+                            text,
+                            pos,
+                            ramap["*"],
+                            status=status,
+                            path=path + [k],
+                            handlers=handlers
+                            and self._match_handlers(handlers, k.split(".")),
+                            shared=shared,
+                        )
+                    else:
+                        # not covered by any rule, kept as is
+                        end = _json_skip(text, pos)
+                        rv = text[pos:end] if status else None
+                else:
+                    if k in ramap:
+                        allowed = ramap[k].get("__", True)
+                    elif "*" in ramap and ramap["*"].get("__", True):
+                        allowed = True
+                    else:
+                        allowed = status
+                    end = _json_skip(text, pos)
+                    rv = text[pos:end] if allowed else None
+                changed = changed or not verbatim
+
+            if rv is None:
+                changed = True
+            elif is_list:
+                parts.append(rv)
+            else:
+                parts.append(f"{raw_key}:{rv}")
+
+            idx += 1
+            pos = _JSON_WS.match(text, end).end()
+            if text[pos : pos + 1] == ",":
+                pos = _JSON_WS.match(text, pos + 1).end()
+            elif text[pos : pos + 1] != close:
+                raise json.JSONDecodeError(f"Expecting ',' or '{close}'", text, pos)
+
+        end = pos + 1
+
+        if not parts:
+            return None, end, False
+
+        if not changed:
+            return text[start:end], end, True
+
+        return text[start] + ",".join(parts) + close, end, False
@@ -1,4 +1,22 @@
+import pytest
+
+
 def pytest_addoption(parser):
     parser.addoption(
         "-P", "--performance", action="store_true", help="run performance tests"
     )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "performance: performance test, only runs with -P"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--performance"):
+        return
+    skip = pytest.mark.skip(reason="performance tests only run with -P")
+    for item in items:
+        if "performance" in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,21 @@
+"""
+Helpers shared by the test modules
+"""
+
+from grainy import core
+
+
+class CountingPermissionSet(core.PermissionSet):
+    """
+    Counts the number of index branches visited by permission checks
+    """
+
+    visits = 0
+
+    def _check(self, *args, **kwargs):
+        self.visits += 1
+        return super()._check(*args, **kwargs)
+
+    def _check_compiled(self, *args, **kwargs):
+        self.visits += 1
+        return super()._check_compiled(*args, **kwargs)
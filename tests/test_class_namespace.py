@@ -1,3 +1,4 @@
+import pickle
 import unittest
 
 from grainy import core
@@ -53,3 +54,47 @@ class TestNamespace(unittest.TestCase):
         self.assertEqual(ns.match(["a", "b", "c", "d"]), False)
         self.assertEqual(ns.match(["b"]), False)
         self.assertEqual(ns.match(["a", "c"]), False)
+
+    def test_of(self):
+        ns = core.Namespace.of("a.b.c")
+        self.assertIsInstance(ns, core.FrozenNamespace)
+        self.assertIsInstance(ns, core.Namespace)
+        self.assertEqual(ns.value, "a.b.c")
+        self.assertEqual(ns.keys, ("a", "b", "c"))
+        self.assertEqual(ns.length, 3)
+
+        # interned
+        self.assertIs(core.Namespace.of("a.b.c"), ns)
+        self.assertIs(core.Namespace.of(["a", "b", "c"]), ns)
+        self.assertIs(core.Namespace.of(ns), ns)
+        self.assertIsNot(core.Namespace.of("a.b.c", strip=False), ns)
+        self.assertEqual(core.Namespace.of("a.b.*").value, "a.b")
+        self.assertEqual(core.Namespace.of("a.b.*", strip=False).value, "a.b.*")
+
+        # compares and hashes like a mutable namespace
+        self.assertEqual(ns, core.Namespace("a.b.c"))
+        self.assertEqual(core.Namespace("a.b.c"), ns)
+        self.assertEqual(ns, "a.b.c")
+        self.assertEqual(hash(ns), hash(core.Namespace("a.b.c")))
+        self.assertEqual(len({ns, core.Namespace("a.b.c")}), 1)
+
+        self.assertEqual((ns + core.Namespace("d")).keys, ("a", "b", "c", "d"))
+        self.assertEqual((core.Namespace("d") + ns).keys, ["d", "a", "b", "c"])
+
+    def test_of_immutable(self):
+        ns = core.Namespace.of("a.b.c")
+        with self.assertRaises(AttributeError):
+            ns.value = "x"
+        with self.assertRaises(TypeError):
+            ns[0] = "x"
+        with self.assertRaises(TypeError):
+            ns.set("x")
+        with self.assertRaises(AttributeError):
+            ns.other = "x"
+        self.assertFalse(hasattr(ns, "__dict__"))
+        self.assertIs(pickle.loads(pickle.dumps(ns)), ns)
+
+        # mutable namespaces keep their instance dict
+        mutable = core.Namespace("a.b.c")
+        mutable.other = "x"
+        self.assertEqual(mutable.__dict__["other"], "x")
@@ -1,7 +1,17 @@
+import copy
+import json
+import mmap
+import pickle
+import random
+import tempfile
+import threading
 import unittest
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from grainy import const, core
 
+from .helpers import CountingPermissionSet
+
 p1 = core.Permission("a", const.PERM_READ)
 p2 = core.Permission("a.b.c", const.PERM_RW)
 
@@ -103,6 +113,40 @@ pdict12 = {"*.5": 15, "a.6": 1, "b.6": 1}
 pdict13 = {"*": 15}
 
 
+def reference_check(keys, branch, flags=None, i=0, explicit=False):
+    """
+    Straight forward index walk that always follows both the exact key
+    and the wildcard branch, used to verify `PermissionSet._check`
+    """
+
+    implicit = branch.get("__implicit")
+    if i >= len(keys):
+        return flags, i, implicit
+
+    result = {}
+    for name, key in [("key", keys[i]), ("wc", "*")]:
+        result[name] = (None, 0, True)
+        if key not in branch:
+            continue
+        if explicit and branch[key].get("__implicit") and i + 1 >= len(keys):
+            continue
+        result[name] = reference_check(
+            keys, branch[key], branch[key].get("__", flags), i + 1, explicit
+        )
+
+    return core._select_match(
+        explicit, flags, i, implicit, *result["key"], *result["wc"]
+    )
+
+
+def reference_get_permissions(pset, namespace, explicit=False):
+    keys = core.Namespace(namespace).keys
+    p, pos, implicit = reference_check(keys, pset.index, explicit=explicit)
+    if not p or (explicit and implicit) or (explicit and pos != len(keys)):
+        p = 0
+    return p
+
+
 class TestPermissionSet(unittest.TestCase):
     def test_init(self):
         pset = core.PermissionSet([p1, p2])
@@ -369,3 +413,1252 @@ class TestPermissionSet(unittest.TestCase):
         applicator.handler("nested.*.data.public.explicit", explicit=True)
         rv = pset.apply(data, applicator=applicator)
         self.assertEqual(rv, expected)
+
+    def test_incremental_index(self):
+        """
+        Adding, changing and removing rules patches the index in place,
+        the result should always be identical to a full rebuild
+        """
+
+        rng = random.Random(1)
+        keys = ["a", "b", "c", "*"]
+
+        pset = core.PermissionSet()
+        for _ in range(500):
+            namespace = ".".join(rng.choice(keys) for _ in range(rng.randint(1, 4)))
+            if namespace in pset and rng.random() < 0.4:
+                del pset[namespace]
+            else:
+                pset[namespace] = rng.choice([0, 1, 2, 3, 15])
+
+            index = pset.index
+            read_access_map = pset.read_access_map
+            pset.update_index()
+            self.assertEqual(index, pset.index)
+            self.assertEqual(read_access_map, pset.read_access_map)
+
+    def test_incremental_index_aliased(self):
+        pset = core.PermissionSet()
+        pset["a.*"] = const.PERM_READ
+        pset["a.b"] = const.PERM_RW
+        pset["x"] = core.Permission("y", const.PERM_READ)
+        self.assertIn("y", pset.index)
+
+        pset["x"] = const.PERM_READ
+        self.assertNotIn("y", pset.index)
+        self.assertIn("x", pset.index)
+
+        del pset["a.*"]
+        self.assertEqual(pset.index["a"]["__implicit"], True)
+        self.assertEqual(pset.check("a.b", const.PERM_WRITE), True)
+
+    def test_incremental_index_deferred(self):
+        """
+        Permissions set without reindexing are indexed by the next change
+        """
+
+        pset = core.PermissionSet()
+        pset.__setitem__("a", const.PERM_READ, reindex=False)
+        self.assertEqual(pset.get_permissions("a"), 0)
+        pset["b"] = const.PERM_READ
+        self.assertEqual(pset.get_permissions("a"), const.PERM_READ)
+
+        pset.__setitem__("c", const.PERM_READ, reindex=False)
+        del pset["b"]
+        self.assertEqual(pset.get_permissions("c"), const.PERM_READ)
+
+        pset.__setitem__("d", const.PERM_READ, reindex=False)
+        merged = core.PermissionSet.merge(pset, core.PermissionSet({"e": 1}))
+        self.assertEqual(merged.get_permissions("d"), const.PERM_READ)
+        overlay = core.OverlayPermissionSet([pset])
+        self.assertEqual(overlay.get_permissions("d"), const.PERM_READ)
+
+    def test_compiled_index(self):
+        pset = core.PermissionSet(pdict, compiled=True)
+        node = pset.compiled_index
+
+        self.assertIsInstance(node, core.IndexNode)
+        self.assertEqual(node.children["a"].flags, const.PERM_READ)
+        self.assertEqual(node.children["a"].implicit, False)
+        self.assertEqual(node.children["a"].children["b"].implicit, True)
+        self.assertIs(node.children["l"].wildcard, node.children["l"].children["*"])
+        self.assertIsNone(node.children["a"].wildcard)
+
+        with self.assertRaises(AttributeError):
+            node.flags = const.PERM_RW
+
+        # leaf nodes share one read-only children mapping
+        leaf = node.children["a"].children["b"].children["c"]
+        self.assertEqual(len(leaf.children), 0)
+        self.assertIs(leaf.children, node.children["b"].children["c"].children)
+        with self.assertRaises(TypeError):
+            leaf.children["x"] = leaf
+
+        # compiled index is rebuilt after the set is changed
+        pset["a"] = const.PERM_RW
+        self.assertIsNot(pset.compiled_index, node)
+        self.assertEqual(pset.compiled_index.children["a"].flags, const.PERM_RW)
+
+    def test_check_compiled(self):
+        namespaces = [
+            "a",
+            "a.b",
+            "a.b.c",
+            "a.b.c.d",
+            "a.b.x.d",
+            "a.b.20525.d.*",
+            "a.b.10356.x.2966.i.private",
+            "a.b.10356.d.20.e.private",
+            "a.5",
+            "e",
+            "e.j.g",
+            "e.k.g.a",
+            "e.h.g.a",
+            "e.m.g.b",
+            "f.g",
+            "k.x.y",
+            "l.m.y",
+            "x.z",
+            "*.5",
+        ]
+        for rules in [pdict, pdict2, pdict3, pdict5, pdict7, pdict8, pdict11, pdict12]:
+            pset = core.PermissionSet(rules)
+            cset = core.PermissionSet(rules, compiled=True)
+            for namespace in namespaces:
+                for explicit in [False, True]:
+                    self.assertEqual(
+                        pset.get_permissions(namespace, explicit=explicit),
+                        cset.get_permissions(namespace, explicit=explicit),
+                        (rules, namespace, explicit),
+                    )
+
+    def test_cache(self):
+        pset = core.PermissionSet(pdict2, cache_size=2)
+        self.assertEqual(pset.cache_info()["maxsize"], 2)
+
+        self.assertEqual(pset.check("a.b.c", const.PERM_WRITE), True)
+        self.assertEqual(pset.check("a.b.c", const.PERM_WRITE), True)
+        self.assertEqual(pset.check("a.b.c", const.PERM_READ, explicit=True), True)
+        info = pset.cache_info()
+        self.assertEqual((info["hits"], info["misses"], info["size"]), (1, 2, 2))
+
+        pset.check("e.f", const.PERM_READ)
+        info = pset.cache_info()
+        self.assertEqual((info["evictions"], info["size"]), (1, 2))
+
+        # every change invalidates cached results
+        generation = pset.generation
+        pset["a.b.c"] = const.PERM_READ
+        self.assertGreater(pset.generation, generation)
+        self.assertEqual(pset.check("a.b.c", const.PERM_WRITE), False)
+
+        generation = pset.generation
+        pset.update({"a.b.c": const.PERM_RW})
+        self.assertGreater(pset.generation, generation)
+        self.assertEqual(pset.check("a.b.c", const.PERM_WRITE), True)
+
+        del pset["a.b.c"]
+        self.assertEqual(pset.check("a.b.c", const.PERM_WRITE), False)
+
+        pset + core.Permission("a.b.c", const.PERM_RW)
+        self.assertEqual(pset.check("a.b.c", const.PERM_WRITE), True)
+
+        self.assertEqual(core.PermissionSet(pdict2).cache_info(), {})
+
+        # cached by the keys that are checked, not the string value
+        rules = [
+            core.Permission("a", const.PERM_READ),
+            core.Permission(core.Namespace("a.*", strip=False), const.PERM_DENY),
+        ]
+        for cache_size in [0, 8]:
+            pset = core.PermissionSet(rules, cache_size=cache_size)
+            for _ in range(2):
+                self.assertEqual(
+                    pset.get_permissions(core.Namespace("a.*", strip=False)),
+                    const.PERM_DENY,
+                )
+                self.assertEqual(pset.get_permissions("a.*"), const.PERM_READ)
+
+    def test_check_engines(self):
+        """
+        Property test: the index walk and the compiled index walk
+        resolve to the same permissions as the reference walk for
+        random, wildcard heavy rule sets
+        """
+
+        rng = random.Random(5)
+        keys = ["a", "b", "*"]
+
+        def random_namespace(depth):
+            return ".".join(rng.choice(keys) for _ in range(rng.randint(1, depth)))
+
+        for _ in range(200):
+            rules = {
+                random_namespace(5): rng.choice([0, 1, 2, 3, 15])
+                for _ in range(rng.randint(1, 12))
+            }
+            pset = core.PermissionSet(rules)
+            cset = core.PermissionSet(rules, compiled=True)
+            for _ in range(20):
+                namespace = random_namespace(6)
+                for explicit in [False, True]:
+                    expected = reference_get_permissions(pset, namespace, explicit)
+                    self.assertEqual(
+                        pset.get_permissions(namespace, explicit=explicit),
+                        expected,
+                        (rules, namespace, explicit),
+                    )
+                    self.assertEqual(
+                        cset.get_permissions(namespace, explicit=explicit),
+                        expected,
+                        (rules, namespace, explicit),
+                    )
+
+    def test_check_wildcard_namespace_visits(self):
+        """
+        Wildcards in the checked namespace should not cause index
+        branches to be walked more than once
+        """
+
+        depth = 24
+        pset = CountingPermissionSet({".".join(["*"] * depth + ["x"]): 1})
+        namespace = ".".join(["*"] * depth + ["x"])
+
+        self.assertEqual(pset.check(namespace, const.PERM_READ), True)
+        self.assertLessEqual(pset.visits, depth + 2)
+
+    def test_check_many(self):
+        rng = random.Random(6)
+        keys = ["a", "b", "c", "*"]
+
+        def random_namespace(depth):
+            return ".".join(rng.choice(keys) for _ in range(rng.randint(1, depth)))
+
+        for _ in range(100):
+            pset = core.PermissionSet(
+                {
+                    random_namespace(4): rng.choice([0, 1, 2, 3, 15])
+                    for _ in range(rng.randint(1, 10))
+                }
+            )
+            namespaces = [random_namespace(5) for _ in range(30)]
+            for explicit in [False, True]:
+                self.assertEqual(
+                    pset.get_permissions_many(namespaces, explicit=explicit),
+                    [pset.get_permissions(ns, explicit=explicit) for ns in namespaces],
+                )
+                self.assertEqual(
+                    pset.check_many(namespaces, const.PERM_READ, explicit=explicit),
+                    [
+                        pset.check(ns, const.PERM_READ, explicit=explicit)
+                        for ns in namespaces
+                    ],
+                )
+
+        pset = core.PermissionSet(pdict5)
+        self.assertEqual(
+            pset.check_many(
+                ["a.b.c", "a.?", "x.y.x", "x.?.x", "r.s", "a.b.c"], const.PERM_WRITE
+            ),
+            [False, False, True, True, False, False],
+        )
+        self.assertEqual(pset.check_many([], const.PERM_READ), [])
+
+    def test_expand(self):
+        pset = core.PermissionSet(pdict5)
+
+        self.assertEqual(
+            sorted(str(ns) for ns in pset.expand("a.b.?")),
+            ["a", "a.b", "a.b.c", "a.b.d", "a.b.e"],
+        )
+        self.assertEqual(
+            sorted(str(ns) for ns in pset.expand("a.b.?", exact=True)),
+            ["a.b.c", "a.b.d", "a.b.e"],
+        )
+        self.assertEqual(
+            sorted(str(ns) for ns in pset.expand("x.?.z", exact=True)), ["x.*.z"]
+        )
+        self.assertEqual(pset.expand("y.?"), [])
+
+    def test_iter_expand(self):
+        pset = core.PermissionSet(pdict5)
+
+        expanded = pset.iter_expand("?.?.?")
+        self.assertIsInstance(next(expanded), core.Namespace)
+
+        namespaces = list(pset.iter_expand("?.?.?"))
+        self.assertEqual(len(namespaces), len(set(namespaces)))
+        self.assertEqual(set(namespaces), set(pset.expand("?.?.?")))
+
+        # expanded namespaces can be changed by the caller
+        namespace = pset.expand("?.?.?")[0]
+        self.assertNotIsInstance(namespace, core.FrozenNamespace)
+        namespace[0] = "changed"
+        self.assertEqual(namespace.keys[0], "changed")
+        self.assertNotIn("changed", [ns.keys[0] for ns in pset.expand("?.?.?")])
+
+    def test_find_handler(self):
+        applicator = core.Applicator(core.PermissionSet(pdict4))
+        self.assertIsNone(applicator.find_handler("a.b"))
+
+        applicator.handler("a.*.c", explicit=True)
+        applicator.handler("a.b.c")
+        applicator.handler("x.y")
+
+        # handlers are matched in the order they were registered
+        self.assertEqual(applicator.find_handler("a.b.c")["namespace"], "a.*.c")
+        self.assertEqual(applicator.find_handler("a.z.c")["namespace"], "a.*.c")
+        self.assertEqual(applicator.find_handler("x.*")["namespace"], "x.y")
+        self.assertEqual(applicator.find_handler(["x", "y"])["namespace"], "x.y")
+        self.assertIsNone(applicator.find_handler("a.b"))
+        self.assertIsNone(applicator.find_handler("a.b.c.d"))
+        self.assertIsNone(applicator.find_handler(""))
+
+        self.assertIn("__", applicator.handler_index["x"]["y"])
+
+        applicator.handler("a.b.*")
+        self.assertEqual(applicator.find_handler("a.b.d")["namespace"], "a.b.*")
+
+        # handlers changed directly
+        del applicator.handlers["a.*.c"]
+        self.assertEqual(applicator.find_handler("a.b.c")["namespace"], "a.b.c")
+        self.assertIsNone(applicator.find_handler("a.z.c"))
+        applicator.handlers.pop("x.y")
+        self.assertIsNone(applicator.find_handler("x.y"))
+        applicator.handlers.clear()
+        self.assertIsNone(applicator.find_handler("a.b.c"))
+        applicator.handlers = {"x.y": {"namespace": core.Namespace("x.y")}}
+        self.assertEqual(applicator.find_handler("x.y")["namespace"], "x.y")
+
+        pset = core.PermissionSet({"a": const.PERM_READ})
+        applicator = core.Applicator(pset)
+        applicator.handler("a.b", explicit=True)
+        data = {"a": {"b": 1, "c": 2}}
+        self.assertEqual(pset.apply(data, applicator=applicator), {"a": {"c": 2}})
+        del applicator.handlers["a.b"]
+        self.assertEqual(pset.apply(data, applicator=applicator), data)
+
+    def test_apply_explicit_read_only(self):
+        """
+        Applying explicit handlers should never change the permission set
+        """
+
+        pset = core.PermissionSet(pdict)
+        index = copy.deepcopy(pset.index)
+        read_access_map = copy.deepcopy(pset.read_access_map)
+        namespaces = pset.namespaces
+        generation = pset.generation
+
+        data = {
+            "a": {"b": {"c": True, "d": False, "f": {"something": "else"}}},
+            "k": {"a": {"nested": {"something": "else"}, "test": True}},
+        }
+        expected = {"a": {"b": {"c": True}}, "k": {"a": {"test": True}}}
+
+        applicator = core.Applicator(pset)
+        applicator.handler("a.b.d", explicit=True)
+        applicator.handler("a.b.f", explicit=True)
+        applicator.handler("k.a.nested", explicit=True)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(
+                executor.map(
+                    lambda _: pset.apply(copy.deepcopy(data), applicator=applicator),
+                    range(20),
+                )
+            )
+
+        for rv in results:
+            self.assertEqual(rv, expected)
+
+        self.assertEqual(pset.index, index)
+        self.assertEqual(pset.read_access_map, read_access_map)
+        self.assertEqual(pset.namespaces, namespaces)
+        self.assertEqual(pset.generation, generation)
+
+        # overlay is reused until the permission set changes
+        self.assertIs(applicator.read_access_map(), applicator.read_access_map())
+        overlay = applicator.read_access_map()
+        pset["a.b.d"] = const.PERM_READ
+        self.assertIsNot(applicator.read_access_map(), overlay)
+        self.assertEqual(
+            pset.apply(copy.deepcopy(data), applicator=applicator),
+            {"a": {"b": {"c": True, "d": False}}, "k": {"a": {"test": True}}},
+        )
+
+    def test_apply_share(self):
+        """
+        Sharing mode should return readable subtrees as they are
+        """
+
+        pset = core.PermissionSet(pdict)
+        data = {
+            "a": {"b": {"e": {"d": 1, "f": 2}}, "x": [{"y": 1}, {"z": 2}]},
+            "b": {"c": {"d": [1, 2]}},
+            "k": {"a": {"nested": {"something": "else"}}, "x": {"y": 1}},
+            "l": {"z": [1], "w": {"y": 1}},
+        }
+        expected = pset.apply(copy.deepcopy(data))
+
+        rv = pset.apply(data, share=True)
+        self.assertEqual(rv, expected)
+        self.assertIsNot(rv, data)
+        self.assertIsNot(rv["a"], data["a"])
+        self.assertEqual(rv["a"]["b"], {"e": {"f": 2}})
+        self.assertIs(rv["a"]["x"], data["a"]["x"])
+        self.assertIs(rv["b"], data["b"])
+        self.assertIs(rv["k"]["a"], data["k"]["a"])
+        self.assertIs(rv["l"]["z"], data["l"]["z"])
+        self.assertNotIn("w", rv["l"])
+
+        # nothing removed, nothing copied
+        unchanged = {"b": data["b"], "l": {"z": [1]}}
+        self.assertIs(pset.apply(unchanged, share=True), unchanged)
+
+        # keys renamed by handlers are never shared
+        applicator = core.Applicator(pset)
+        applicator.handler("b.c", key=lambda row, idx: "{}s".format(idx))
+        rv = pset.apply(data, applicator=applicator, share=True)
+        self.assertEqual(rv, pset.apply(copy.deepcopy(data), applicator=applicator))
+        self.assertEqual(rv["b"], {"c": {"ds": [1, 2]}})
+        self.assertIs(rv["a"]["x"], data["a"]["x"])
+        self.assertIs(rv["k"]["a"], data["k"]["a"])
+
+        # shared branches follow changes to the permission set
+        pset["b.c.ds"] = const.PERM_DENY
+        self.assertNotIn("b", pset.apply(data, applicator=applicator, share=True))
+
+        # readable branches are kept with the permission set, not the
+        # applicator, and follow changes to it
+        branches = core.Applicator(pset).readable_branches()
+        self.assertIs(core.Applicator(pset).readable_branches(), branches)
+        pset["l.w"] = const.PERM_READ
+        self.assertIsNot(core.Applicator(pset).readable_branches(), branches)
+        self.assertIn("w", pset.apply(data, share=True)["l"])
+        applicator = core.Applicator(pset)
+        applicator.handler("k.a", explicit=True)
+        self.assertIsNot(
+            applicator.readable_branches(), core.Applicator(pset).readable_branches()
+        )
+
+        # denied empty containers are removed, as they are without sharing
+        pset = core.PermissionSet({"*": const.PERM_READ, "x": const.PERM_DENY})
+        for empty in [{}, []]:
+            data = {"x": empty, "y": 1}
+            self.assertEqual(pset.apply(data, share=True), {"y": 1})
+            self.assertEqual(pset.apply(data, share=True), pset.apply(data))
+            rows = core.Applicator(
+                core.PermissionSet({"*": const.PERM_READ, "*.x": const.PERM_DENY})
+            ).iter_apply([data], share=True)
+            self.assertEqual(list(rows), [{"y": 1}])
+        pset = core.PermissionSet({"a.*.*": const.PERM_READ})
+        self.assertEqual(pset.apply({"a": {}}, share=True), {})
+
+    def test_iter_apply(self):
+        pset = core.PermissionSet(pdict4)
+        rows = [
+            {"level": "public", "some": "data", "explicit": {"sekret": "data"}},
+            {"level": "private", "sekret": "data"},
+            {"level": "public", "other": "data"},
+        ]
+
+        applicator = core.Applicator(pset)
+        applicator.handler("nested.*.data", key=lambda row, idx: row["level"])
+        applicator.handler("nested.*.data.public.explicit", explicit=True)
+
+        consumed = []
+
+        def generate():
+            for row in rows:
+                consumed.append(row)
+                yield copy.deepcopy(row)
+
+        it = applicator.iter_apply(generate(), path=["nested", "0", "data"])
+        self.assertEqual(next(it), {"level": "public", "some": "data"})
+        self.assertEqual(len(consumed), 1)
+        self.assertEqual(list(it), [{"level": "public", "other": "data"}])
+
+        expected = applicator.apply({"nested": [{"data": copy.deepcopy(rows)}]})
+        self.assertEqual(
+            list(applicator.iter_apply(rows, path=["nested", "0", "data"])),
+            expected["nested"][0]["data"],
+        )
+
+        # rows not covered by any rule
+        self.assertEqual(list(applicator.iter_apply(rows, path=["unknown"])), [])
+
+    def test_namespace_key_iter_apply(self):
+        pset = core.PermissionSet({"a": const.PERM_READ, "a.b": const.PERM_DENY})
+        applicator = core.NamespaceKeyApplicator(pset)
+        rows = (
+            {"_grainy": namespace, "id": i}
+            for i, namespace in enumerate(["a", "a.b", "a.c", "b"])
+        )
+
+        it = applicator.iter_apply(rows)
+        self.assertEqual(next(it), {"id": 0})
+        self.assertEqual(list(it), [{"id": 2}])
+
+    def test_json_apply(self):
+        pset = core.PermissionSet(pdict4)
+        data = {
+            "a": {"b": {"c": [1, 2]}, "c": {"d": "denied"}},
+            "x": [{"id": "y", "v": 1}, {"id": "z", "v": 2}],
+            "nested": [
+                {
+                    "data": [
+                        {"level": "public", "some": 'da\\"ta'},
+                        {"level": "private", "sekret": "data"},
+                    ]
+                }
+            ],
+            "unknown": {"deep": [{"a": 1}]},
+        }
+
+        applicator = core.Applicator(pset)
+        json_applicator = core.JSONApplicator(pset)
+        for _applicator in (applicator, json_applicator):
+            _applicator.handler("nested.*.data", key=lambda row, idx: row["level"])
+
+        expected = applicator.apply(copy.deepcopy(data))
+        text = json.dumps(data, indent=2)
+
+        rv = json_applicator.apply(text)
+        self.assertIsInstance(rv, str)
+        self.assertEqual(json.loads(rv), expected)
+
+        rv = pset.apply(text.encode("utf-8"), applicator=json_applicator)
+        self.assertIsInstance(rv, bytes)
+        self.assertEqual(json.loads(rv), expected)
+
+        # readable values are copied through as they are
+        self.assertIn(
+            json.dumps(data["a"]["b"], indent=2).replace("\n", "\n    "), rv.decode()
+        )
+
+        self.assertEqual(json_applicator.apply("[1, 2]"), "[1, 2]")
+        with self.assertRaises(json.JSONDecodeError):
+            json_applicator.apply('{"a": {"b": 1}} x')
+
+        # denied values are skipped, empty ones included
+        json_applicator = core.JSONApplicator(
+            core.PermissionSet({"*": const.PERM_READ, "x": const.PERM_DENY})
+        )
+        for denied in ["{}", "[]", '{"a": ["]", {"b": "\\"}"}]}']:
+            rv = json_applicator.apply(f'{{"x": {denied}, "y": 1}}')
+            self.assertEqual(json.loads(rv), {"y": 1})
+
+        # rules below the rows of a list
+        pset = core.PermissionSet({"rows": const.PERM_READ, "rows.*.data": 0})
+        data = {"rows": [{"id": i, "data": {"v": i}} for i in range(3)]}
+        rv = core.JSONApplicator(pset).apply(json.dumps(data))
+        self.assertEqual(json.loads(rv), pset.apply(copy.deepcopy(data)))
+
+    def test_namespace_key_cache(self):
+        pset = core.PermissionSet({"a": const.PERM_READ, "a.b": const.PERM_DENY})
+        applicator = core.NamespaceKeyApplicator(pset)
+        called = []
+        applicator.handler("a.c", fn=lambda namespace, row: called.append(row["id"]))
+
+        rows = [
+            {"_grainy": namespace, "id": i}
+            for i, namespace in enumerate(["a", "a.b", "a.c"] * 10)
+        ]
+        rv = applicator.apply(copy.deepcopy(rows))
+        self.assertEqual(len(rv), 20)
+        self.assertEqual(len(called), 10)
+        self.assertEqual(applicator.cache_info()["hits"], 27)
+        self.assertEqual(applicator.cache_info()["misses"], 3)
+
+        # decisions are dropped when the permission set changes
+        pset["a.b"] = const.PERM_READ
+        self.assertEqual(len(applicator.apply(copy.deepcopy(rows))), 30)
+
+        # or the handlers
+        applicator.handler("a.b", explicit=True)
+        self.assertEqual(applicator.cache_info()["size"], 0)
+
+        uncached = core.NamespaceKeyApplicator(pset, cache_size=0)
+        self.assertEqual(uncached.cache_info(), {})
+        self.assertEqual(len(uncached.apply(copy.deepcopy(rows))), 30)
+
+    def test_apply_level(self):
+        pset = core.PermissionSet(
+            {
+                "a": const.PERM_READ,
+                "a.b": const.PERM_CREATE | const.PERM_READ,
+                "a.c": const.PERM_UPDATE | const.PERM_READ,
+                "d": const.PERM_CRUD,
+                "d.e": const.PERM_READ,
+            }
+        )
+        data = {
+            "a": {"b": 1, "c": {"x": 1}, "f": 1},
+            "d": {"e": 1, "g": [1, 2]},
+        }
+
+        self.assertEqual(pset.apply(copy.deepcopy(data)), data)
+        self.assertEqual(
+            pset.apply(copy.deepcopy(data), level=const.PERM_UPDATE),
+            {"a": {"c": {"x": 1}}, "d": {"g": [1, 2]}},
+        )
+        self.assertEqual(
+            pset.apply(copy.deepcopy(data), level=const.PERM_WRITE),
+            {"a": {"b": 1, "c": {"x": 1}}, "d": {"g": [1, 2]}},
+        )
+
+        # maps are built once per level and dropped on change
+        update_map = pset.access_map(const.PERM_UPDATE)
+        self.assertIs(pset.access_map(const.PERM_UPDATE), update_map)
+        self.assertIs(pset.access_map(), pset.read_access_map)
+        pset["a.f"] = const.PERM_UPDATE
+        self.assertIsNot(pset.access_map(const.PERM_UPDATE), update_map)
+        self.assertEqual(pset.access_map(const.PERM_UPDATE)["a"]["f"], {"__": True})
+
+        applicator = core.Applicator(pset)
+        applicator.handler("d.h", explicit=True)
+        data["d"]["h"] = 1
+        self.assertEqual(
+            applicator.apply(copy.deepcopy(data), level=const.PERM_UPDATE),
+            {"a": {"c": {"x": 1}, "f": 1}, "d": {"g": [1, 2]}},
+        )
+        self.assertIs(
+            applicator.access_map(const.PERM_UPDATE),
+            applicator.access_map(const.PERM_UPDATE),
+        )
+        self.assertIsNot(
+            applicator.access_map(), applicator.access_map(const.PERM_UPDATE)
+        )
+
+    def test_dumps_loads(self):
+        pset = core.PermissionSet(pdict2)
+        pset["x.*"] = const.PERM_READ
+        pset["y"] = core.Permission(core.Namespace("y.*", strip=False), None)
+        pset["ü.b"] = const.PERM_RW
+
+        data = pset.dumps()
+        self.assertIsInstance(data, bytes)
+
+        loaded = core.PermissionSet.loads(data, compiled=True)
+        self.assertTrue(loaded.compiled)
+        self.assertEqual(loaded.permissions, pset.permissions)
+        self.assertEqual(loaded.index, pset.index)
+        self.assertEqual(loaded.read_access_map, pset.read_access_map)
+        self.assertEqual(loaded.dumps(), data)
+        self.assertEqual(
+            loaded.check("e.x.g.b", const.PERM_WRITE),
+            pset.check("e.x.g.b", const.PERM_WRITE),
+        )
+
+        # aliased keys still trigger a full rebuild
+        del loaded["x.*"]
+        self.assertNotIn("x", loaded.index)
+
+        with self.assertRaises(ValueError):
+            core.PermissionSet.loads(b"nope")
+        with self.assertRaises(ValueError):
+            core.PermissionSet.loads(data[:-3])
+
+    def test_loads_mmap(self):
+        pset = core.PermissionSet(pdict)
+        with tempfile.TemporaryFile() as fh:
+            fh.write(pset.dumps())
+            fh.flush()
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                loaded = core.PermissionSet.loads(data)
+        self.assertEqual(loaded.index, pset.index)
+        self.assertEqual(loaded.check("a.b.c", const.PERM_WRITE), True)
+
+    def test_pickle(self):
+        pset = core.PermissionSet(pdict, cache_size=10)
+        pset.check("a.b.c", const.PERM_READ)
+        pset.custom = "value"
+
+        loaded = pickle.loads(pickle.dumps(pset))
+        self.assertEqual(loaded.permissions, pset.permissions)
+        self.assertEqual(loaded.index, pset.index)
+        self.assertEqual(loaded.read_access_map, pset.read_access_map)
+        self.assertEqual(loaded.custom, "value")
+        self.assertEqual(loaded.cache.maxsize, 10)
+        self.assertEqual(len(loaded.cache), 0)
+        self.assertEqual(loaded.check("a.b.c", const.PERM_WRITE), True)
+
+        loaded["a.b.c"] = const.PERM_READ
+        self.assertEqual(loaded.check("a.b.c", const.PERM_WRITE), False)
+        self.assertEqual(pset.check("a.b.c", const.PERM_WRITE), True)
+
+    def test_pickle_legacy(self):
+        """
+        Sets pickled by previous versions, with their permissions and
+        index pickled as they are
+        """
+
+        def legacy(cls, state):
+            # what unpickling does with the state of an object
+            instance = cls.__new__(cls)
+            if hasattr(instance, "__setstate__"):
+                instance.__setstate__(state)
+            else:
+                instance.__dict__.update(state)
+            return instance
+
+        expected = core.PermissionSet(pdict)
+        permissions = {}
+        for key, permission in expected.permissions.items():
+            namespace = legacy(
+                core.Namespace,
+                {
+                    "value": str(permission.namespace),
+                    "keys": list(permission.namespace.keys),
+                    "length": permission.namespace.length,
+                },
+            )
+            permissions[key] = legacy(
+                core.Permission, {"namespace": namespace, "value": permission.value}
+            )
+
+        pset = legacy(
+            core.PermissionSet,
+            {
+                "permissions": permissions,
+                "index": copy.deepcopy(expected.index),
+                "read_access_map": copy.deepcopy(expected.read_access_map),
+            },
+        )
+        self.assertEqual(pset.permissions, expected.permissions)
+        self.assertEqual(pset.check("a.b.c", const.PERM_WRITE), True)
+        self.assertEqual(pset.apply({"k": {"a": 1}}), expected.apply({"k": {"a": 1}}))
+
+        loaded = pickle.loads(pickle.dumps(pset))
+        self.assertEqual(loaded.index, expected.index)
+
+        pset["a.b.c"] = const.PERM_READ
+        self.assertEqual(pset.check("a.b.c", const.PERM_WRITE), False)
+        namespace = pset.permissions["a"].namespace
+        namespace[0] = "b"
+        self.assertEqual(str(namespace), "b")
+
+    def test_snapshot(self):
+        pset = core.PermissionSet(pdict)
+        snapshot = pset.snapshot()
+        self.assertIsInstance(snapshot, core.FrozenPermissionSet)
+        self.assertIs(snapshot.snapshot(), snapshot)
+
+        index = copy.deepcopy(pset.index)
+        read_access_map = copy.deepcopy(pset.read_access_map)
+        permissions = dict(pset.permissions)
+
+        pset["a.b.c"] = const.PERM_READ
+        pset["x.*"] = const.PERM_READ
+        del pset["k"]
+        pset.update({"a.b": const.PERM_DENY, "z": const.PERM_RW})
+
+        # snapshot is unchanged by later changes
+        self.assertEqual(snapshot.index, index)
+        self.assertEqual(snapshot.read_access_map, read_access_map)
+        self.assertEqual(snapshot.permissions, permissions)
+        self.assertEqual(snapshot.check("a.b.c", const.PERM_WRITE), True)
+        self.assertEqual(pset.check("a.b.c", const.PERM_WRITE), False)
+        self.assertEqual(snapshot.apply({"k": {"a": 1}}), {"k": {"a": 1}})
+        self.assertEqual(pset.apply({"k": {"a": 1}}), {})
+
+        # and still matches a rebuild of the permission set
+        rebuilt = core.PermissionSet(
+            {key: permission.value for key, permission in pset.permissions.items()}
+        )
+        self.assertEqual(pset.index, rebuilt.index)
+        self.assertEqual(pset.read_access_map, rebuilt.read_access_map)
+
+        with self.assertRaises(TypeError):
+            snapshot["a"] = const.PERM_RW
+        with self.assertRaises(TypeError):
+            del snapshot["a"]
+        with self.assertRaises(TypeError):
+            snapshot.update_index()
+        with self.assertRaises(TypeError):
+            snapshot.update({"x": const.PERM_READ})
+        with self.assertRaises(TypeError):
+            snapshot.apply_delta(added={"x": const.PERM_READ})
+        with self.assertRaises(TypeError):
+            snapshot.index = {}
+
+        self.assertEqual(pickle.loads(pickle.dumps(snapshot)).index, index)
+
+    def test_set_attributes(self):
+        """
+        Permissions, index and read access map can still be replaced
+        """
+
+        pset = core.PermissionSet({"a": const.PERM_READ})
+        generation = pset.generation
+
+        # permissions are indexed by `update_index` or the next change
+        pset.permissions = {"b": core.Permission("b", const.PERM_RW)}
+        self.assertEqual(pset.generation, generation + 1)
+        pset.update_index()
+        self.assertEqual(pset.get_permissions("a"), 0)
+        self.assertEqual(pset.get_permissions("b"), const.PERM_RW)
+        pset.permissions = {"c": core.Permission("c", const.PERM_READ)}
+        pset["d"] = const.PERM_READ
+        self.assertEqual(pset.get_permissions("c"), const.PERM_READ)
+        self.assertNotIn("b", pset.index)
+
+        pset.index = {"x": {"__": const.PERM_READ, "__implicit": False}}
+        self.assertEqual(pset.get_permissions("x"), const.PERM_READ)
+        pset.read_access_map = {"x": {"__": True}}
+        self.assertEqual(pset.apply({"x": 1, "y": 2}), {"x": 1})
+
+    def test_update_atomic(self):
+        pset = core.PermissionSet({"a": const.PERM_READ})
+        generation = pset.generation
+
+        # a failed update is not published
+        with self.assertRaises(TypeError):
+            pset.update({"b": const.PERM_READ, "c": "invalid"})
+        self.assertEqual(pset.generation, generation)
+        self.assertNotIn("b", pset.index)
+        self.assertNotIn("b", pset.permissions)
+
+        # an update is published as a single change
+        pset.update({"b": const.PERM_READ, "c": const.PERM_READ})
+        self.assertEqual(pset.generation, generation + 1)
+
+    def test_update_aliased(self):
+        """
+        Updating a set holding aliased keys rebuilds the index once
+        """
+
+        pset = core.PermissionSet()
+        pset["x.*"] = const.PERM_READ
+        pset.instrument()
+        rules = {f"k{i}.v": i % 4 for i in range(200)}
+        rules["y.*"] = const.PERM_RW
+        pset.update(rules)
+        self.assertLessEqual(pset.stats()["rebuild"], 1)
+
+        index = pset.index
+        pset.update_index()
+        self.assertEqual(index, pset.index)
+
+        # no aliased keys, the index is patched
+        pset = core.PermissionSet({"a": const.PERM_READ})
+        pset.instrument()
+        pset.update({"a.b": const.PERM_RW, "c": const.PERM_READ})
+        self.assertEqual(pset.stats()["rebuild"], 0)
+        self.assertEqual(pset.index, core.PermissionSet(list(pset)).index)
+
+    def test_snapshot_concurrent(self):
+        """
+        Snapshots taken while another thread updates the set always
+        see either all or none of an update
+        """
+
+        pset = core.PermissionSet()
+        done = threading.Event()
+
+        def write():
+            try:
+                for i in range(200):
+                    value = const.PERM_READ if i % 2 else const.PERM_DENY
+                    pset.update({f"{k}.b.c": value for k in "abcdefgh"})
+            finally:
+                done.set()
+
+        def read():
+            seen = 0
+            while not done.is_set():
+                snapshot = pset.snapshot()
+                values = {
+                    snapshot.check(f"{k}.b.c", const.PERM_READ) for k in "abcdefgh"
+                }
+                self.assertEqual(len(values), 1)
+                seen += 1
+            return seen
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            readers = [executor.submit(read) for _ in range(2)]
+            try:
+                executor.submit(write).result(timeout=60)
+            finally:
+                # stop the readers whatever happened to the writer
+                done.set()
+            _, pending = wait(readers, timeout=60)
+            self.assertFalse(pending)
+            for reader in readers:
+                reader.result()
+
+    def test_overlay(self):
+        base = core.PermissionSet(pdict)
+        role = core.PermissionSet({"a.b": const.PERM_RW, "e.f": const.PERM_READ})
+        overrides = {
+            "a.b.c": const.PERM_DENY,
+            "k.x": const.PERM_READ,
+            "l.z": const.PERM_RW,
+        }
+        index = copy.deepcopy(base.index)
+
+        pset = core.OverlayPermissionSet([base, role], overrides)
+
+        combined = dict(pdict)
+        combined.update({"a.b": const.PERM_RW, "e.f": const.PERM_READ})
+        combined.update(overrides)
+        flat = core.PermissionSet(combined)
+
+        self.assertEqual(pset.index, flat.index)
+        self.assertEqual(pset.read_access_map, flat.read_access_map)
+        self.assertEqual(
+            pset.overrides, {k: core.Permission(k, v) for k, v in overrides.items()}
+        )
+        self.assertEqual(sorted(pset.namespaces), sorted(combined))
+        for ns in [
+            "a",
+            "a.b.c",
+            "a.b.x.d",
+            "a.c",
+            "b.c",
+            "e.f",
+            "k.x.y",
+            "l.a.y",
+            "l.z",
+            "x",
+        ]:
+            self.assertEqual(pset.get_permissions(ns), flat.get_permissions(ns))
+            self.assertEqual(
+                pset.check(ns, const.PERM_READ), flat.check(ns, const.PERM_READ)
+            )
+        data = {
+            "a": {"b": {"c": 1, "d": 2}, "c": 3},
+            "k": {"x": {"y": 1, "z": 2}},
+            "l": {"z": 1},
+        }
+        self.assertEqual(pset.apply(data), flat.apply(data))
+        self.assertEqual(pset.expand("a.*.c"), flat.expand("a.*.c"))
+
+        # branches the overrides do not touch are shared with the base,
+        # which is left unchanged
+        self.assertIs(pset.index["b"], base.index["b"])
+        self.assertIs(pset.index["a"]["c"], base.index["a"]["c"])
+        self.assertEqual(base.index, index)
+
+        # changes to the overlay stay out of the base
+        pset["b.c"] = const.PERM_DENY
+        self.assertEqual(base.index, index)
+        self.assertEqual(base.get_permissions("b.c"), const.PERM_READ)
+        self.assertEqual(pset.get_permissions("b.c"), const.PERM_DENY)
+
+        # removing an override lets the base permission apply again
+        del pset["b.c"]
+        self.assertEqual(pset.get_permissions("b.c"), const.PERM_READ)
+        del pset["l.z"]
+        del combined["l.z"]
+        self.assertEqual(pset.index, core.PermissionSet(combined).index)
+        with self.assertRaises(KeyError):
+            del pset["a"]
+        self.assertEqual(base.index, index)
+
+        # changes to the base after the overlay was created are not seen
+        base["x"] = const.PERM_READ
+        self.assertEqual(pset.get_permissions("x"), const.PERM_DENY)
+
+        restored = pickle.loads(pickle.dumps(pset))
+        self.assertEqual(restored.index, pset.index)
+        self.assertEqual(restored.overrides, pset.overrides)
+
+    def test_merge(self):
+        pset_a = core.PermissionSet(pdict)
+        pset_b = core.PermissionSet(pdict2)
+        index_a = copy.deepcopy(pset_a.index)
+
+        combined = dict(pdict)
+        combined.update(pdict2)
+        merged = pset_a | pset_b
+        flat = core.PermissionSet(combined)
+        self.assertEqual(merged.index, flat.index)
+        self.assertEqual(merged.read_access_map, flat.read_access_map)
+        self.assertEqual(merged.permissions, flat.permissions)
+        self.assertIsNone(merged.cache)
+
+        # the merged set takes the cache size and mode of the left operand
+        merged = core.PermissionSet(pdict, compiled=True, cache_size=16) | pset_b
+        self.assertTrue(merged.compiled)
+        self.assertEqual(merged.cache.maxsize, 16)
+        self.assertEqual(merged.index, flat.index)
+
+        combined = dict(pdict)
+        for key, value in pdict2.items():
+            combined[key] = combined.get(key, 0) | value
+        merged = core.PermissionSet.merge(pset_a, pset_b, strategy=const.MERGE_OR)
+        flat = core.PermissionSet(combined)
+        self.assertEqual(merged.index, flat.index)
+        self.assertEqual(merged.read_access_map, flat.read_access_map)
+        self.assertEqual(merged.get_permissions("a.b.c"), const.PERM_RW)
+        self.assertEqual(merged.get_permissions("a.b.e"), const.PERM_DENY)
+        self.assertEqual(merged.get_permissions("a.c"), const.PERM_WRITE)
+
+        # the merged set and the sets it was merged from can be changed
+        # independently
+        merged["k"] = const.PERM_DENY
+        pset_a["b.c"] = const.PERM_DENY
+        self.assertEqual(pset_a.get_permissions("k"), const.PERM_READ)
+        self.assertEqual(merged.get_permissions("b.c"), const.PERM_READ)
+        pset_a["b.c"] = const.PERM_READ
+        self.assertEqual(pset_a.index, index_a)
+
+        # aliased permissions are merged as well
+        merged = core.PermissionSet.merge(
+            core.PermissionSet([core.Permission("x.*", const.PERM_READ)]),
+            core.PermissionSet({"x.y": const.PERM_DENY}),
+        )
+        self.assertEqual(merged.get_permissions("x.z"), const.PERM_READ)
+        self.assertEqual(merged.get_permissions("x.y"), const.PERM_DENY)
+
+        self.assertEqual(core.PermissionSet.merge().permissions, {})
+        with self.assertRaises(ValueError):
+            core.PermissionSet.merge(pset_a, strategy="and")
+
+    def test_apply_delta(self):
+        pset = core.PermissionSet(pdict)
+        snapshot = pset.snapshot()
+
+        prefixes = pset.apply_delta(
+            added={"a.b.c.d": const.PERM_DENY, "x.y": const.PERM_READ},
+            changed={"a.b.c": const.PERM_READ, "l": const.PERM_READ},
+            removed=["k.x.y", "a.c"],
+        )
+
+        rules = dict(pdict)
+        del rules["k.x.y"]
+        del rules["a.c"]
+        rules.update({"a.b.c": const.PERM_READ, "a.b.c.d": const.PERM_DENY})
+        rules.update({"x.y": const.PERM_READ})
+        expected = core.PermissionSet(rules)
+        self.assertEqual(pset.index, expected.index)
+        self.assertEqual(pset.read_access_map, expected.read_access_map)
+
+        # unchanged permission "l" and "a.b.c.d" below "a.b.c" are not
+        # reported
+        self.assertEqual(prefixes, {"a.b.c", "x.y", "k.x.y", "a.c"})
+        for namespace in ["a.b.c.x", "k.x.y", "a.c", "x.y.z"]:
+            self.assertNotEqual(
+                pset.get_permissions(namespace), snapshot.get_permissions(namespace)
+            )
+            self.assertTrue(
+                any(
+                    core.Namespace(namespace).match(prefix.split("."))
+                    for prefix in prefixes
+                )
+            )
+
+        # nothing is applied if any part of the delta fails
+        generation = pset.generation
+        with self.assertRaises(KeyError):
+            pset.apply_delta(added={"z": const.PERM_READ}, removed=["missing"])
+        with self.assertRaises(KeyError):
+            pset.apply_delta(changed={"missing": const.PERM_READ})
+        self.assertEqual(pset.generation, generation)
+        self.assertNotIn("z", pset.permissions)
+
+    def test_instrument(self):
+        pset = core.PermissionSet(pdict, cache_size=10)
+        self.assertEqual(pset.stats(), {})
+
+        events = []
+        pset.instrument(callback=lambda name, elapsed: events.append(name))
+        self.assertEqual(pset.check("a.b.c", const.PERM_READ), True)
+        self.assertEqual(pset.check("a.b.c", const.PERM_READ), True)
+        self.assertEqual(pset.get_permissions("l.x.y"), const.PERM_DENY)
+        expanded = pset.expand("a.?")
+        pset.update_index()
+        pset["x.*"] = const.PERM_READ
+        pset.apply({"a": {"b": 1}})
+
+        stats = pset.stats()
+        self.assertEqual(stats["check"], 2)
+        self.assertEqual(stats["get_permissions"], 3)
+        self.assertEqual(stats["expand"], 1)
+        self.assertEqual(stats["expanded"], len(expanded))
+        self.assertEqual(stats["update_index"], 1)
+        self.assertEqual(stats["apply"], 1)
+        # update_index and the aliased "x.*" permission
+        self.assertEqual(stats["rebuild"], 2)
+        self.assertEqual(stats["cache_hits"], 1)
+        self.assertEqual(stats["cache_misses"], 2)
+        # root, "a", "b", "c" and "a.b.*" for "a.b.c", root, "l", "l.*"
+        # and "l.*.y" for "l.x.y"
+        self.assertEqual(stats["nodes"], 9)
+        self.assertEqual(stats["wildcards"], 2)
+        self.assertGreater(stats["rebuild_time"], 0)
+        self.assertEqual(
+            events,
+            ["get_permissions", "check", "get_permissions", "check"]
+            + ["get_permissions", "expand", "rebuild", "update_index", "rebuild"]
+            + ["apply"],
+        )
+
+        compiled = core.PermissionSet(pdict, compiled=True)
+        compiled.instrument()
+        compiled.get_permissions("l.x.y")
+        self.assertEqual(compiled.stats()["nodes"], 4)
+        self.assertEqual(compiled.stats()["wildcards"], 1)
+
+        # instrumentation is not pickled
+        restored = pickle.loads(pickle.dumps(pset))
+        self.assertEqual(restored.stats(), {})
+        self.assertEqual(restored.check("a.b.c", const.PERM_READ), True)
+
+        # disabling it restores the methods of the class
+        pset.instrument(False)
+        self.assertEqual(pset.stats(), {})
+        for name in ["check", "_check", "_index_rebuild"]:
+            self.assertNotIn(name, pset.__dict__)
+
+    def test_minimize(self):
+        rules = {
+            "a": const.PERM_READ,
+            "a.b": const.PERM_READ,
+            "a.b.c": const.PERM_RW,
+            "a.b.c.d": const.PERM_RW,
+            "x": const.PERM_READ,
+            "x.y": const.PERM_READ,
+            "x.z": const.PERM_DENY,
+            "k.*.m": const.PERM_WRITE,
+            "k.l.m": const.PERM_WRITE,
+            "k.n.m": const.PERM_READ,
+        }
+        pset = core.PermissionSet(rules)
+
+        minimized, removed = pset.minimize()
+        # covered by the sibling wildcard
+        self.assertEqual(removed, 1)
+        self.assertNotIn("k.l.m", minimized.permissions)
+
+        implicit, removed = pset.minimize(explicit=False)
+        # also covered by the parent
+        self.assertEqual(removed, 4)
+        self.assertEqual(
+            sorted(implicit.permissions),
+            ["a", "a.b.c", "k.*.m", "k.n.m", "x", "x.z"],
+        )
+        self.assertNotIn("y", implicit.index["x"])
+        self.assertNotIn("d", implicit.index["a"]["b"]["c"])
+
+        keys = ["a", "b", "c", "d", "x", "y", "z", "k", "l", "m", "*", "n"]
+        rng = random.Random(23)
+        namespaces = [
+            ".".join(rng.choice(keys) for _ in range(rng.randint(1, 5)))
+            for _ in range(2000)
+        ]
+        for namespace in namespaces:
+            for explicit in [False, True]:
+                self.assertEqual(
+                    minimized.get_permissions(namespace, explicit=explicit),
+                    pset.get_permissions(namespace, explicit=explicit),
+                )
+            self.assertEqual(
+                implicit.get_permissions(namespace), pset.get_permissions(namespace)
+            )
+
+        # the set itself is left unchanged
+        self.assertEqual(len(pset.permissions), len(rules))
+
+    def test_analyze(self):
+        pset = core.PermissionSet(
+            {
+                "a": const.PERM_READ,
+                "a.b.c": const.PERM_RW,
+                "a.*.d": const.PERM_DENY,
+                "*.x": const.PERM_READ,
+            }
+        )
+        analysis = pset.analyze()
+        self.assertEqual(analysis["permissions"], 4)
+        self.assertEqual(analysis["nodes"], 7)
+        self.assertEqual(analysis["depth"], 3)
+        self.assertEqual(analysis["fanout"], {0: 3, 1: 3, 2: 1})
+        self.assertEqual(analysis["max_fanout"], 2)
+        self.assertEqual(analysis["wildcards"], {0: 1, 1: 1})
+        # root, "a", "a.b", "a.b.c", "a.*", "a.*.d", "*" and "*.x"
+        self.assertEqual(analysis["max_visits"], 8)
+        self.assertEqual(analysis["max_paths"], 3)
+        self.assertGreater(analysis["memory"], 0)
+
+        # the visit bound holds for actual checks
+        pset.instrument()
+        for namespace in ["a.b.c", "a.b.d", "a.x.d", "x.x", "*.*.*", "a.*.c.d"]:
+            visits = pset.stats()["nodes"]
+            pset.get_permissions(namespace)
+            self.assertLessEqual(pset.stats()["nodes"] - visits, analysis["max_visits"])
+
+        # wildcards at every position make checks follow more paths
+        wide = core.PermissionSet(
+            {".".join(["*"] * i + ["k"]): const.PERM_READ for i in range(6)}
+        )
+        self.assertGreater(wide.analyze()["max_paths"], analysis["max_paths"])
+
+        analysis = core.PermissionSet().analyze()
+        self.assertEqual(analysis["nodes"], 0)
+        self.assertEqual(analysis["fanout"], {})
+        self.assertEqual(analysis["max_visits"], 1)
+
+    def test_compile_template(self):
+        rules = {
+            "org": const.PERM_READ,
+            "org.1": const.PERM_RW,
+            "org.*.net": const.PERM_READ,
+            "org.1.net.2": const.PERM_CRUD,
+            "org.2.net.*": const.PERM_DENY,
+            "org.*.net.*.poc": const.PERM_WRITE,
+            "org.1.net.3": const.PERM_READ,
+        }
+        values = [
+            (1, 2),
+            (1, 3),
+            (2, 2),
+            (3, 4),
+            ("*", 2),
+            (1, "*"),
+            ("1.net", 2),
+            (1, "2.poc"),
+            ("?", 2),
+        ]
+
+        for compiled in [False, True]:
+            pset = core.PermissionSet(rules, compiled=compiled)
+            for template in ["org.{}.net.{}", "org.{org}.net.{net}.poc"]:
+                for explicit in [False, True]:
+                    checker = pset.compile_template(template, explicit=explicit)
+                    namespaces = [
+                        template.replace("{org}", "{}")
+                        .replace("{net}", "{}")
+                        .format(*value)
+                        for value in values
+                    ]
+                    expected = [
+                        pset.get_permissions(namespace, explicit=explicit)
+                        for namespace in namespaces
+                    ]
+                    self.assertEqual([checker(value) for value in values], expected)
+                    self.assertEqual(checker.many(values), expected)
+                    for value, namespace in zip(values, namespaces):
+                        self.assertEqual(
+                            checker.check(value, const.PERM_READ),
+                            pset.check(namespace, const.PERM_READ, explicit=explicit),
+                        )
+
+        # changes to the permission set are picked up
+        pset = core.PermissionSet(rules)
+        checker = pset.compile_template("org.{}.net.{}")
+        self.assertEqual(checker((2, 2)), const.PERM_DENY)
+        pset["org.2.net.2"] = const.PERM_RW
+        self.assertEqual(checker((2, 2)), const.PERM_RW)
+        del pset["org.2.net"]
+        self.assertEqual(checker((2, 3)), const.PERM_READ)
+
+        # trailing wildcards are stripped
+        checker = pset.compile_template("org.{}.*")
+        self.assertEqual(checker((1,)), pset.get_permissions("org.1"))
+
+        with self.assertRaises(ValueError):
+            pset.compile_template("org.x{}.net")
+        with self.assertRaises(ValueError):
+            checker((1, 2))
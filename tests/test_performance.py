@@ -0,0 +1,321 @@
+"""
+Benchmarks for permission checks, namespace expansion, index builds
+and applicators on synthetic rule sets and payloads
+
+The benchmarks only run with the `-P` (`--performance`) option, use
+`-s` to see their results:
+
+    pytest -P -s tests/test_performance.py
+
+Scaling tests counting index branch visits always run.
+"""
+
+import json
+import math
+import random
+import time
+import tracemalloc
+import unittest
+
+import pytest
+
+from grainy import const, core
+
+from .helpers import CountingPermissionSet
+
+RULE_COUNTS = [10, 1000, 100000, 1000000]
+DEPTHS = [2, 4, 8, 16]
+WILDCARD_DENSITIES = [0.0, 0.1, 0.3, 0.5]
+PAYLOAD_SIZES = [10, 1000, 100000]
+
+# parameters not being varied by a benchmark
+RULE_COUNT = 1000
+DEPTH = 4
+WILDCARD_DENSITY = 0.1
+
+# number of calls timed per benchmark
+CALLS = 2000
+
+FLAGS = [const.PERM_DENY, const.PERM_READ, const.PERM_RW, const.PERM_CRUD]
+
+
+def key_count(count, depth):
+    """
+    Number of distinct keys per namespace level for rule sets of the
+    specified size and depth
+    """
+    return max(2, math.ceil(count ** (1 / depth)) * 2)
+
+
+def generate_rules(count, depth, wildcards=0.0, seed=0):
+    """
+    Generates `count` rules with namespaces of up to `depth` keys, each
+    key being a wildcard with a probability of `wildcards`
+    """
+    rng = random.Random(seed)
+    keys = [f"k{i}" for i in range(key_count(count, depth))]
+    rules = {}
+    while len(rules) < count:
+        namespace = ".".join(
+            "*" if rng.random() < wildcards else rng.choice(keys)
+            for _ in range(rng.randint(1, depth))
+        )
+        # trailing wildcards are stripped, see `Namespace`
+        rules[str(core.Namespace(namespace))] = rng.choice(FLAGS)
+    return rules
+
+
+def generate_namespaces(count, rules_count, depth, expand=0.0, seed=1):
+    """
+    Generates `count` namespaces of `depth` keys matching the key
+    distribution of `generate_rules`, each key being a "?" with a
+    probability of `expand`
+    """
+    rng = random.Random(seed)
+    keys = [f"k{i}" for i in range(key_count(rules_count, depth))]
+    return [
+        ".".join(
+            "?" if rng.random() < expand else rng.choice(keys) for _ in range(depth)
+        )
+        for _ in range(count)
+    ]
+
+
+def generate_payload(size, rules_count, depth, seed=2):
+    """
+    Generates a nested payload of about `size` values with paths
+    matching the key distribution of `generate_rules`
+    """
+    rng = random.Random(seed)
+    keys = [f"k{i}" for i in range(key_count(rules_count, depth))]
+    payload = {}
+    for _ in range(size):
+        branch = payload
+        path = [rng.choice(keys) for _ in range(rng.randint(1, depth))]
+        for key in path[:-1]:
+            if not isinstance(branch.get(key), dict):
+                branch[key] = {}
+            branch = branch[key]
+        branch[path[-1]] = rng.randint(0, 100)
+    return payload
+
+
+def measure(fn, args):
+    """
+    Calls `fn` once per item in `args`, returns ops/sec and latency
+    percentiles (in microseconds)
+    """
+    latencies = []
+    timer = time.perf_counter
+    start = timer()
+    for arg in args:
+        t = timer()
+        fn(arg)
+        latencies.append(timer() - t)
+    total = timer() - start
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e6
+
+    return {
+        "ops/sec": len(latencies) / total,
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+    }
+
+
+def peak_memory(fn):
+    """
+    Calls `fn` and returns its result along with the peak memory
+    allocated during the call (in bytes)
+    """
+    tracemalloc.start()
+    try:
+        result = fn()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def report(name, params, result):
+    params = " ".join(f"{k}={v}" for k, v in params.items())
+    result = " ".join(
+        f"{k}={v / 1048576:.1f}MiB" if k == "peak" else f"{k}={v:.1f}"
+        for k, v in result.items()
+    )
+    print(f"\n{name:<24} {params:<48} {result}", end="")
+
+
+def variations():
+    """
+    Yields rule count, depth and wildcard density, varying one of them
+    at a time
+    """
+    for count in RULE_COUNTS:
+        yield count, DEPTH, WILDCARD_DENSITY
+    for depth in DEPTHS:
+        if depth != DEPTH:
+            yield RULE_COUNT, depth, WILDCARD_DENSITY
+    for wildcards in WILDCARD_DENSITIES:
+        if wildcards != WILDCARD_DENSITY:
+            yield RULE_COUNT, DEPTH, wildcards
+
+
+@pytest.mark.performance
+class TestPerformance(unittest.TestCase):
+    def test_check(self):
+        for count, depth, wildcards in variations():
+            rules = generate_rules(count, depth, wildcards)
+            namespaces = generate_namespaces(CALLS, count, depth)
+            for compiled in [False, True]:
+                pset, peak = peak_memory(
+                    lambda: core.PermissionSet(rules, compiled=compiled)
+                )
+                if compiled:
+                    pset.compiled_index
+                result = measure(lambda ns: pset.check(ns, const.PERM_READ), namespaces)
+                result.update(peak=peak)
+                report(
+                    "check",
+                    {
+                        "rules": count,
+                        "depth": depth,
+                        "wildcards": wildcards,
+                        "compiled": compiled,
+                    },
+                    result,
+                )
+
+    def test_expand(self):
+        for count, depth, wildcards in variations():
+            pset = core.PermissionSet(generate_rules(count, depth, wildcards))
+            namespaces = generate_namespaces(CALLS // 10, count, depth, expand=0.3)
+            report(
+                "expand",
+                {"rules": count, "depth": depth, "wildcards": wildcards},
+                measure(pset.expand, namespaces),
+            )
+
+    def test_update_index(self):
+        for count, depth, wildcards in variations():
+            rules = generate_rules(count, depth, wildcards)
+            pset, peak = peak_memory(lambda: core.PermissionSet(rules))
+            result = measure(lambda _: pset.update_index(), range(3))
+            result.update(peak=peak)
+            report(
+                "update_index",
+                {"rules": count, "depth": depth, "wildcards": wildcards},
+                result,
+            )
+
+            changes = generate_rules(CALLS, depth, wildcards, seed=3)
+            report(
+                "setitem",
+                {"rules": count, "depth": depth, "wildcards": wildcards},
+                measure(lambda item: pset.__setitem__(*item), changes.items()),
+            )
+
+    def test_apply(self):
+        for size in PAYLOAD_SIZES:
+            pset = core.PermissionSet(
+                generate_rules(RULE_COUNT, DEPTH, WILDCARD_DENSITY)
+            )
+            payload = generate_payload(size, RULE_COUNT, DEPTH)
+            calls = max(3, CALLS // size)
+            for share in [False, True]:
+                _, peak = peak_memory(lambda: pset.apply(payload, share=share))
+                result = measure(
+                    lambda _: pset.apply(payload, share=share), range(calls)
+                )
+                result.update(peak=peak)
+                report("apply", {"payload": size, "share": share}, result)
+
+    def test_json_apply(self):
+        """
+        `JSONApplicator` against decoding, applying and encoding the
+        document on documents that are mostly denied
+        """
+        pset = core.PermissionSet({"*": const.PERM_READ, "denied": const.PERM_DENY})
+        applicator = core.JSONApplicator(pset)
+        for size in PAYLOAD_SIZES:
+            rows = [
+                {"id": i, "name": f"row {i}", "tags": ["a", "b"], "data": {"x": i}}
+                for i in range(size)
+            ]
+            text = json.dumps(
+                {
+                    "denied": rows,
+                    "readable": generate_payload(size // 100, RULE_COUNT, DEPTH),
+                }
+            )
+            calls = max(3, CALLS // size)
+            report(
+                "json_apply",
+                {"payload": size},
+                measure(lambda _: applicator.apply(text), range(calls)),
+            )
+            report(
+                "json_apply loads/dumps",
+                {"payload": size},
+                measure(
+                    lambda _: json.dumps(pset.apply(json.loads(text), share=True)),
+                    range(calls),
+                ),
+            )
+
+    def test_namespace(self):
+        for depth in DEPTHS:
+            namespaces = generate_namespaces(CALLS, RULE_COUNT, depth)
+            report("Namespace", {"depth": depth}, measure(core.Namespace, namespaces))
+            report(
+                "Namespace.of", {"depth": depth}, measure(core.Namespace.of, namespaces)
+            )
+
+
+class TestScaling(unittest.TestCase):
+    """
+    Index branch visits per check should grow no more than linearly
+    with the depth of the namespace
+    """
+
+    depths = [8, 16, 32, 64, 128]
+
+    def visits(self, rules, namespace, compiled=False):
+        pset = CountingPermissionSet(rules, compiled=compiled)
+        pset.check(namespace, const.PERM_READ)
+        return pset.visits
+
+    def assertLinear(self, visits):
+        for depth, count in zip(self.depths, visits):
+            self.assertLessEqual(count, 2 * depth + 2, (depth, visits))
+        for previous, count in zip(visits, visits[1:]):
+            # depths double from one to the next
+            self.assertLessEqual(count, 2 * previous + 2, visits)
+
+    def test_chain(self):
+        """
+        An exact and a wildcard rule at every depth
+        """
+        for compiled in [False, True]:
+            visits = []
+            for depth in self.depths:
+                keys = [f"k{i}" for i in range(depth)]
+                rules = {}
+                for i in range(1, depth + 1):
+                    rules[".".join(keys[:i])] = const.PERM_READ
+                    rules[".".join(keys[: i - 1] + ["*"])] = const.PERM_DENY
+                visits.append(self.visits(rules, ".".join(keys), compiled))
+            self.assertLinear(visits)
+
+    def test_wildcards(self):
+        """
+        Wildcards in both the rule and the checked namespace
+        """
+        for compiled in [False, True]:
+            visits = []
+            for depth in self.depths:
+                namespace = ".".join(["*"] * depth + ["x"])
+                visits.append(self.visits({namespace: 1}, namespace, compiled))
+            self.assertLinear(visits)
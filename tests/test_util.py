@@ -1,4 +1,5 @@
 import unittest
+import weakref
 
 from grainy import const, core
 
@@ -15,3 +16,66 @@ class TestUtils(unittest.TestCase):
             core.int_flags("crud"),
             const.PERM_CREATE | const.PERM_READ | const.PERM_UPDATE | const.PERM_DELETE,
         )
+
+    def test_int_flags_mapper(self):
+        mapper = [(0x01, "x"), (0x02, "y"), (0x03, "z")]
+        self.assertEqual(core.int_flags("x", mapper), 0x01)
+        self.assertEqual(core.int_flags("xy", mapper), 0x03)
+        self.assertEqual(core.int_flags("z", mapper), 0x03)
+        self.assertEqual(core.int_flags("r", mapper), 0)
+        self.assertEqual(core.int_flags("r"), const.PERM_READ)
+        self.assertEqual(core.int_flags(""), 0)
+        self.assertEqual(core.int_flags(const.PERM_RW), const.PERM_RW)
+        with self.assertRaises(TypeError):
+            core.int_flags(["r"])
+
+    def test_flag_tables_cache(self):
+        class Mapper(list):
+            pass
+
+        # tables are cached by mapper content, mappers are not kept
+        mapper = Mapper([(0x01, "x"), (0x02, "y")])
+        ref = weakref.ref(mapper)
+        self.assertEqual(core.int_flags("xy", mapper), 0x03)
+        self.assertEqual(core.str_flags(0x03, list(mapper)), "xy")
+        del mapper
+        self.assertIsNone(ref())
+
+        for i in range(core.FLAG_MAPPER_CACHE_SIZE * 2):
+            self.assertEqual(core.int_flags("x", [(i + 1, "x")]), i + 1)
+        self.assertLessEqual(
+            core._cached_flag_tables.cache_info().currsize,
+            core.FLAG_MAPPER_CACHE_SIZE,
+        )
+
+        # unhashable mapper entries
+        self.assertEqual(core.int_flags("xy", [[0x01, "x"], [0x02, "y"]]), 0x03)
+
+    def test_int_flags_many(self):
+        self.assertEqual(
+            core.int_flags_many(["r", "crud", "r", "", None, const.PERM_UPDATE]),
+            [
+                const.PERM_READ,
+                const.PERM_CRUD,
+                const.PERM_READ,
+                0,
+                0,
+                const.PERM_UPDATE,
+            ],
+        )
+        with self.assertRaises(TypeError):
+            core.int_flags_many(["r", ["r"]])
+
+    def test_str_flags(self):
+        self.assertEqual(core.str_flags(const.PERM_READ), "r")
+        self.assertEqual(core.str_flags(const.PERM_CRUD), "crud")
+        self.assertEqual(core.str_flags(const.PERM_READ | const.PERM_UPDATE), "ru")
+        self.assertEqual(core.str_flags(const.PERM_DENY), "")
+        self.assertEqual(core.str_flags(0x10 | const.PERM_READ), "r")
+        self.assertEqual(core.str_flags("cr"), "cr")
+        for flags in range(16):
+            self.assertEqual(core.int_flags(core.str_flags(flags)), flags)
+        self.assertEqual(core.str_flags(0x03, [(0x01, "x"), (0x03, "z")]), "xz")
+        self.assertEqual(core.str_flags(1 << 20 | 1, [(1, "a"), (1 << 20, "b")]), "ab")
+        with self.assertRaises(TypeError):
+            core.str_flags(1.0)